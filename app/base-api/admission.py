@@ -0,0 +1,224 @@
+"""
+Admission control for the base API.
+
+Keeps a pod responsive when a burst outruns autoscaling:
+- Token bucket rate limit per route class (read / write)
+- Concurrency cap with a bounded wait queue
+- Early 503 + Retry-After once queueing delay passes the target
+
+Reads are handed free slots ahead of writes. Probe and metrics
+endpoints are never throttled so Kubernetes and Zabbix keep working
+while the pod is shedding load.
+
+All state is per worker process and only touched from the event loop,
+so no locking is needed.
+"""
+import asyncio
+import math
+import time
+from collections import deque
+
+from common.metrics import (
+    admission_requests_queued_total,
+    admission_requests_shed_total,
+    admission_queue_depth,
+    admission_in_flight
+)
+
+EXEMPT_PATHS = {"/health", "/ready", "/metrics"}
+# Everything under /metrics too (e.g. /metrics/sketches behind the p99 trigger)
+EXEMPT_PREFIXES = ("/metrics/",)
+READ_METHODS = {"GET", "HEAD", "OPTIONS"}
+
+# Slots are handed to waiting requests in this order
+ROUTE_CLASS_PRIORITY = ("read", "write")
+
+# Smoothing factor for the service time estimate
+SERVICE_TIME_ALPHA = 0.1
+
+
+def is_exempt(path: str) -> bool:
+    """True for probe and metrics endpoints, which are never throttled."""
+    return path in EXEMPT_PATHS or path.startswith(EXEMPT_PREFIXES)
+
+
+def route_class(method: str) -> str:
+    """Classify a request as read or write by HTTP method."""
+    return "read" if method.upper() in READ_METHODS else "write"
+
+
+class TokenBucket:
+    """Token bucket refilled continuously at `rate` tokens per second."""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = float(rate)
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+
+    def try_acquire(self) -> float:
+        """
+        Take one token.
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is available
+        """
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return 0.0
+
+        if self.rate <= 0:
+            return math.inf
+        return (1 - self.tokens) / self.rate
+
+
+class Rejected(Exception):
+    """Raised when a request is not admitted."""
+
+    def __init__(self, reason: str, status_code: int, retry_after: float):
+        super().__init__(reason)
+        self.reason = reason
+        self.status_code = status_code
+        self.retry_after = max(1, math.ceil(retry_after)) if math.isfinite(retry_after) else 60
+
+
+class AdmissionController:
+    """
+    Per-process admission controller.
+
+    Usage:
+        await controller.acquire("read")   # may raise Rejected
+        try:
+            ...handle request...
+        finally:
+            controller.release(elapsed)
+    """
+
+    def __init__(self, client_id: str, limits: dict):
+        self.client_id = client_id
+        self.buckets = {
+            "read": TokenBucket(limits["read_rate"], limits["read_burst"]),
+            "write": TokenBucket(limits["write_rate"], limits["write_burst"]),
+        }
+        self.max_concurrency = int(limits["max_concurrency"])
+        self.max_queue = int(limits["max_queue"])
+        self.queue_target = limits["queue_target_ms"] / 1000.0
+
+        self.in_flight = 0
+        self.waiters = {cls: deque() for cls in ROUTE_CLASS_PRIORITY}
+        # Smoothed time a request holds a slot, used to predict queueing delay
+        self.service_time = 0.0
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(len(q) for q in self.waiters.values())
+
+    def expected_wait(self, position: int) -> float:
+        """Estimate how long a request joining the queue at `position` will wait."""
+        return (position + 1) * self.service_time / self.max_concurrency
+
+    async def acquire(self, route_class: str):
+        """
+        Admit a request or raise Rejected.
+
+        Returns once the caller holds a concurrency slot, which must be
+        given back with release().
+        """
+        retry_after = self.buckets[route_class].try_acquire()
+        if retry_after:
+            self._shed(route_class, "rate_limited")
+            raise Rejected("rate_limited", 429, retry_after)
+
+        if self.in_flight < self.max_concurrency and not self.queue_depth:
+            self.in_flight += 1
+            self._update_gauges()
+            return
+
+        # Reads only queue behind other reads; writes queue behind everything
+        if route_class == "read":
+            position = len(self.waiters["read"])
+        else:
+            position = self.queue_depth
+
+        if self.queue_depth >= self.max_queue:
+            self._shed(route_class, "queue_full")
+            raise Rejected("queue_full", 503, self.queue_target)
+
+        if self.expected_wait(position) > self.queue_target:
+            self._shed(route_class, "queue_delay")
+            raise Rejected("queue_delay", 503, self.expected_wait(position))
+
+        await self._wait_for_slot(route_class)
+
+    async def _wait_for_slot(self, route_class: str):
+        waiter = asyncio.get_running_loop().create_future()
+        queue = self.waiters[route_class]
+        queue.append(waiter)
+        admission_requests_queued_total.labels(
+            route_class=route_class,
+            client=self.client_id
+        ).inc()
+        self._update_gauges()
+
+        try:
+            await asyncio.wait([waiter], timeout=self.queue_target)
+        except asyncio.CancelledError:
+            # Client went away while queued
+            if waiter.done() and not waiter.cancelled():
+                self.release(None)
+            else:
+                self._discard(queue, waiter)
+            raise
+
+        if waiter.done():
+            # Slot was handed over by release()
+            return
+
+        self._discard(queue, waiter)
+        self._shed(route_class, "queue_timeout")
+        raise Rejected("queue_timeout", 503, self.queue_target)
+
+    def release(self, held_for):
+        """
+        Give back a concurrency slot, handing it to the next waiter if any.
+
+        Args:
+            held_for: Seconds the slot was held, or None if unknown
+        """
+        if held_for is not None:
+            self.service_time += SERVICE_TIME_ALPHA * (held_for - self.service_time)
+
+        for cls in ROUTE_CLASS_PRIORITY:
+            queue = self.waiters[cls]
+            while queue:
+                waiter = queue.popleft()
+                if not waiter.done():
+                    waiter.set_result(None)
+                    self._update_gauges()
+                    return
+
+        self.in_flight -= 1
+        self._update_gauges()
+
+    def _discard(self, queue: deque, waiter: asyncio.Future):
+        waiter.cancel()
+        try:
+            queue.remove(waiter)
+        except ValueError:
+            pass
+        self._update_gauges()
+
+    def _shed(self, route_class: str, reason: str):
+        admission_requests_shed_total.labels(
+            route_class=route_class,
+            reason=reason,
+            client=self.client_id
+        ).inc()
+
+    def _update_gauges(self):
+        admission_in_flight.labels(client=self.client_id).set(self.in_flight)
+        admission_queue_depth.labels(client=self.client_id).set(self.queue_depth)
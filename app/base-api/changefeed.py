@@ -0,0 +1,228 @@
+"""
+Change feed for items.
+
+Item mutations are published as sequenced events that clients can stream
+(SSE or WebSocket) instead of polling the list endpoint.
+
+The write path only appends the event to a bounded history and hands it
+to a dispatcher task, so it costs the same with zero or thousands of
+subscribers. The dispatcher fans events out to per-subscriber bounded
+queues; a subscriber whose queue fills up is evicted and can reconnect,
+resuming from the last event id it saw while that is still in history.
+
+Event ids are "<epoch>-<seq>". Sequence numbers are per process and start
+over on restart, and a reconnect may land on another worker or replica,
+so the epoch (random per process) tells whether an id came from this
+feed. Ids from anywhere else get a reset event.
+"""
+import asyncio
+import json
+import logging
+import secrets
+from collections import deque
+from datetime import datetime
+from typing import Optional
+
+from common.metrics import change_feed_subscribers, change_feed_evictions_total
+
+logger = logging.getLogger(__name__)
+
+
+class ChangeEvent:
+    """
+    A sequenced item mutation, serialized once for every subscriber.
+
+    Keeps the (category, status) of the item before and after the change,
+    so a filtered subscriber also hears about items leaving its view.
+    """
+
+    __slots__ = ("id", "seq", "op", "states", "data")
+
+    def __init__(self, epoch: str, seq: int, op: str, item: Optional[dict], previous: Optional[dict] = None):
+        self.id = f"{epoch}-{seq}"
+        self.seq = seq
+        self.op = op
+        self.states = [(i.get("category"), i["status"]) for i in (item, previous) if i]
+        self.data = json.dumps(
+            {"id": self.id, "seq": seq, "op": op, "item": item},
+            default=datetime.isoformat
+        )
+
+
+class SubscriberEvicted(Exception):
+    """Raised to a subscriber that fell too far behind."""
+
+
+class Subscription:
+    """One client's filtered view of the feed."""
+
+    def __init__(self, category: Optional[str], status: Optional[str], queue_size: int):
+        self.category = category
+        self.status = status
+        self.queue = asyncio.Queue(maxsize=queue_size)
+        self.backlog = deque()
+        self.cursor = 0
+        self.evicted = False
+
+    def matches(self, event: ChangeEvent) -> bool:
+        """True if the item is in this view before or after the change."""
+        return any(
+            (not self.category or category == self.category) and (not self.status or status == self.status)
+            for category, status in event.states
+        )
+
+    async def get(self) -> ChangeEvent:
+        """
+        Next event for this subscriber.
+
+        Raises:
+            SubscriberEvicted: Once queued events are drained after eviction
+        """
+        if self.backlog:
+            return self.backlog.popleft()
+        if self.evicted and self.queue.empty():
+            raise SubscriberEvicted()
+        return await self.queue.get()
+
+
+class ChangeFeed:
+    """
+    Sequenced item change events with resumable subscriptions.
+
+    Usage:
+        event = feed.prepare("update", item, previous)   # when the item changes
+        feed.publish(event)                    # once the change is committed
+
+        subscription = feed.subscribe(since=last_event_id, category="contacts")
+        try:
+            event = await subscription.get()
+        finally:
+            feed.unsubscribe(subscription)
+    """
+
+    def __init__(self, client_id: str, history: int = 10000, queue_size: int = 1000):
+        self.client_id = client_id
+        self.queue_size = queue_size
+        self.epoch = secrets.token_hex(4)
+        self.seq = 0
+        self.published_seq = 0
+        self._history = deque(maxlen=history)
+        self._subscribers = set()
+        self._dispatch_queue = deque()
+        self._dispatch_wakeup: Optional[asyncio.Event] = None
+        self._dispatcher: Optional[asyncio.Task] = None
+
+    @property
+    def oldest_seq(self) -> int:
+        """Lowest sequence number still available for resuming."""
+        return self._history[0].seq if self._history else self.published_seq + 1
+
+    def prepare(self, op: str, item: dict, previous: Optional[dict] = None) -> ChangeEvent:
+        """
+        Sequence and serialize a mutation at the moment it happens.
+
+        Args:
+            op: Mutation name
+            item: Item after the change
+            previous: Item before the change, if it existed
+        """
+        self.seq += 1
+        return ChangeEvent(self.epoch, self.seq, op, item, previous)
+
+    def publish(self, event: ChangeEvent):
+        """Record an event and queue it for delivery; O(1) in the subscriber count."""
+        self._history.append(event)
+        self.published_seq = event.seq
+        if self._subscribers:
+            self._dispatch_queue.append(event)
+            self._dispatch_wakeup.set()
+
+    def subscribe(
+        self,
+        since: Optional[str] = None,
+        category: Optional[str] = None,
+        status: Optional[str] = None
+    ) -> Subscription:
+        """
+        Register a subscriber.
+
+        Args:
+            since: Last event id the client has seen; later events still
+                in history are delivered first. Ids this feed cannot
+                account for start the stream with a reset event.
+            category: Only deliver events for items in this category
+                before or after the change
+            status: Only deliver events for items with this status
+                before or after the change, so a delete still reaches
+                subscribers to active items
+        """
+        subscription = Subscription(category, status, self.queue_size)
+
+        if since is not None:
+            seq = self._own_seq(since)
+            if seq is None or seq > self.published_seq:
+                # Issued by another process: nothing here says what was missed
+                subscription.backlog.append(ChangeEvent(self.epoch, self.published_seq, "reset", None))
+            elif seq < self.published_seq:
+                if seq < self.oldest_seq - 1:
+                    # Part of the gap is gone: the client must re-list before streaming
+                    subscription.backlog.append(ChangeEvent(self.epoch, self.oldest_seq - 1, "reset", None))
+
+                missed = []
+                for event in reversed(self._history):
+                    if event.seq <= seq:
+                        break
+                    if subscription.matches(event):
+                        missed.append(event)
+                subscription.backlog.extend(reversed(missed))
+
+        # Anything published so far is covered by the backlog (or was not asked for)
+        subscription.cursor = self.published_seq
+
+        self._subscribers.add(subscription)
+        change_feed_subscribers.labels(client=self.client_id).set(len(self._subscribers))
+        self._ensure_dispatcher()
+        return subscription
+
+    def _own_seq(self, event_id: str) -> Optional[int]:
+        """Sequence number of an id issued by this feed, else None."""
+        epoch, _, seq = event_id.partition("-")
+        if epoch != self.epoch or not seq.isdigit():
+            return None
+        return int(seq)
+
+    def unsubscribe(self, subscription: Subscription):
+        self._subscribers.discard(subscription)
+        change_feed_subscribers.labels(client=self.client_id).set(len(self._subscribers))
+
+    def _ensure_dispatcher(self):
+        if self._dispatcher is None or self._dispatcher.done():
+            self._dispatch_wakeup = asyncio.Event()
+            self._dispatcher = asyncio.create_task(self._dispatch_loop())
+
+    async def _dispatch_loop(self):
+        while True:
+            await self._dispatch_wakeup.wait()
+            self._dispatch_wakeup.clear()
+
+            while self._dispatch_queue:
+                event = self._dispatch_queue.popleft()
+                for subscription in list(self._subscribers):
+                    if event.seq <= subscription.cursor:
+                        continue
+                    subscription.cursor = event.seq
+                    if not subscription.matches(event):
+                        continue
+                    try:
+                        subscription.queue.put_nowait(event)
+                    except asyncio.QueueFull:
+                        self._evict(subscription)
+
+                # Give subscribers a chance to run between large bursts
+                await asyncio.sleep(0)
+
+    def _evict(self, subscription: Subscription):
+        subscription.evicted = True
+        self.unsubscribe(subscription)
+        change_feed_evictions_total.labels(client=self.client_id).inc()
+        logger.warning(f"Evicted slow change feed subscriber at seq {subscription.cursor}")
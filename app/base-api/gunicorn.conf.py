@@ -0,0 +1,24 @@
+"""
+Gunicorn hooks for the base API.
+
+Loaded automatically from the working directory. Workers record Prometheus
+metrics into PROMETHEUS_MULTIPROC_DIR so /metrics covers the whole pod.
+"""
+import os
+import shutil
+
+from prometheus_client import multiprocess
+
+
+def on_starting(server):
+    """Start with no metric files, so pod counters restart from zero like the pod."""
+    directory = os.environ.get("PROMETHEUS_MULTIPROC_DIR")
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def child_exit(server, worker):
+    """Drop the live gauges of a worker that exited; its counters are kept."""
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(worker.pid)
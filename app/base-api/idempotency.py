@@ -0,0 +1,317 @@
+"""
+Idempotency-Key support for write endpoints.
+
+A client that retries a timed-out request with the same Idempotency-Key
+gets the original response back instead of a second write:
+- Completed results are kept in a bounded TTL/LRU cache
+- Requests arriving while the first one is still running wait for it
+  and share its result
+- With the SQL backend, keys are also recorded in the database so a
+  retry that lands on another worker is recognised too
+
+Reusing a key with a different request body is rejected.
+"""
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Optional, Tuple
+
+from sqlalchemy import create_engine, delete, inspect, or_
+from sqlalchemy.exc import IntegrityError, ProgrammingError
+from sqlalchemy.orm import sessionmaker
+
+from models import IdempotencyRecord
+
+logger = logging.getLogger(__name__)
+
+# Backoff between attempts to record a result after complete() failed
+RECORD_RETRY_MIN_SECONDS = 1.0
+RECORD_RETRY_MAX_SECONDS = 60.0
+
+
+class IdempotencyMismatch(Exception):
+    """The key was already used for a different request."""
+
+
+class IdempotencyInProgress(Exception):
+    """Another worker is still processing a request with this key."""
+
+
+class SqlIdempotencyStore:
+    """
+    Idempotency keys shared across workers through the database.
+
+    A key is claimed by inserting a row without a response; the primary
+    key makes the claim atomic. Until the owner records its response,
+    other requests with the key get IdempotencyInProgress. Only claims
+    older than pending_timeout are assumed to belong to a worker that
+    died before writing and are taken over, so it must be far longer
+    than any request, and owners keep retrying to record their response
+    well within it (see IdempotencyCache).
+    """
+
+    def __init__(self, session_factory, ttl_seconds: int, pending_timeout: float = 3600):
+        self.session_factory = session_factory
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.pending_timeout = timedelta(seconds=pending_timeout)
+
+    @classmethod
+    def from_url(cls, database_url: str, ttl_seconds: int, pending_timeout: float = 3600) -> "SqlIdempotencyStore":
+        engine = create_engine(database_url, pool_pre_ping=True)
+        try:
+            IdempotencyRecord.__table__.create(engine, checkfirst=True)
+        except (ProgrammingError, IntegrityError):
+            # Every worker starts at once; the check-then-create is not atomic,
+            # so another worker may have created the table in between
+            if not inspect(engine).has_table(IdempotencyRecord.__tablename__):
+                raise
+        return cls(sessionmaker(engine), ttl_seconds, pending_timeout)
+
+    async def claim(self, key: str, fingerprint: str) -> Optional[Tuple[str, dict]]:
+        """
+        Claim a key for processing.
+
+        Returns:
+            None if the caller now owns the key, otherwise the
+            (fingerprint, result) recorded by an earlier request
+
+        Raises:
+            IdempotencyInProgress: If another worker holds a live claim
+        """
+        return await asyncio.to_thread(self._claim, key, fingerprint)
+
+    async def complete(self, key: str, result: dict):
+        await asyncio.to_thread(self._complete, key, result)
+
+    async def release(self, key: str):
+        """Drop an unfinished claim so the request can be retried."""
+        await asyncio.to_thread(self._release, key)
+
+    async def purge_expired(self) -> int:
+        """Delete expired keys; returns how many were removed."""
+        return await asyncio.to_thread(self._purge_expired)
+
+    async def run_purge(self, interval: float):
+        """Purge expired keys every `interval` seconds."""
+        while True:
+            await asyncio.sleep(interval)
+            try:
+                removed = await self.purge_expired()
+            except Exception as e:
+                logger.error(f"Idempotency key purge failed: {e}")
+                continue
+            if removed:
+                logger.info(f"Purged {removed} expired idempotency keys")
+
+    def _purge_expired(self) -> int:
+        now = datetime.utcnow()
+        with self.session_factory() as session:
+            result = session.execute(
+                delete(IdempotencyRecord)
+                .where(IdempotencyRecord.expires_at < now)
+                .where(or_(
+                    IdempotencyRecord.response.is_not(None),
+                    IdempotencyRecord.created_at < now - self.pending_timeout
+                ))
+            )
+            session.commit()
+            return result.rowcount
+
+    def _claim(self, key: str, fingerprint: str) -> Optional[Tuple[str, dict]]:
+        now = datetime.utcnow()
+        with self.session_factory() as session:
+            session.add(IdempotencyRecord(
+                key=key,
+                fingerprint=fingerprint,
+                created_at=now,
+                expires_at=now + self.ttl
+            ))
+            try:
+                session.commit()
+                return None
+            except IntegrityError:
+                session.rollback()
+
+            record = session.get(IdempotencyRecord, key, with_for_update=True)
+            if record is None:
+                # Deleted between our insert and read; the retry will claim it
+                raise IdempotencyInProgress(key)
+
+            if record.response is None:
+                # The owner may still be writing, or have written without recording it yet
+                takeover = record.created_at < now - self.pending_timeout
+            else:
+                takeover = record.expires_at < now
+            if takeover:
+                record.fingerprint = fingerprint
+                record.response = None
+                record.created_at = now
+                record.expires_at = now + self.ttl
+                session.commit()
+                return None
+
+            if record.response is None:
+                raise IdempotencyInProgress(key)
+            return record.fingerprint, json.loads(record.response)
+
+    def _complete(self, key: str, result: dict):
+        with self.session_factory() as session:
+            record = session.get(IdempotencyRecord, key)
+            if record is not None:
+                record.response = json.dumps(result)
+                session.commit()
+
+    def _release(self, key: str):
+        with self.session_factory() as session:
+            session.execute(
+                delete(IdempotencyRecord)
+                .where(IdempotencyRecord.key == key)
+                .where(IdempotencyRecord.response.is_(None))
+            )
+            session.commit()
+
+
+class IdempotencyCache:
+    """
+    Per-worker idempotency cache with in-flight request coalescing.
+
+    Usage:
+        result, replayed = await cache.execute(key, fingerprint, operation)
+
+    `operation` is only awaited if no request with this key has completed
+    or is in flight; its result must be JSON-serializable.
+
+    Once the operation has run, its result is recorded in the store before
+    the claim can go stale: failed attempts are retried in the background,
+    so another worker replays the result instead of running it again.
+    """
+
+    def __init__(
+        self,
+        max_entries: int = 10000,
+        ttl_seconds: int = 86400,
+        store: Optional[SqlIdempotencyStore] = None
+    ):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.store = store
+        # key -> (expires_at, fingerprint, result), least recently used first
+        self._results = OrderedDict()
+        # key -> (fingerprint, future)
+        self._in_flight = {}
+        # Background retries of results that could not be recorded yet
+        self._recording = set()
+
+    async def execute(
+        self,
+        key: str,
+        fingerprint: str,
+        operation: Callable[[], Awaitable[dict]]
+    ) -> Tuple[dict, bool]:
+        """
+        Run operation once per key.
+
+        Returns:
+            tuple: (result, replayed) where replayed is True if the result
+            came from an earlier request
+
+        Raises:
+            IdempotencyMismatch: If the key was used with another fingerprint
+            IdempotencyInProgress: If another worker is processing the key
+        """
+        cached = self._get(key)
+        if cached is not None:
+            self._check(key, fingerprint, cached[0])
+            return cached[1], True
+
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            self._check(key, fingerprint, in_flight[0])
+            return await asyncio.shield(in_flight[1]), True
+
+        future = asyncio.get_running_loop().create_future()
+        # Mark a failure as retrieved even if nobody else was waiting on it
+        future.add_done_callback(lambda f: f.cancelled() or f.exception())
+        self._in_flight[key] = (fingerprint, future)
+
+        claimed = False
+        try:
+            if self.store is not None:
+                stored = await self.store.claim(key, fingerprint)
+                if stored is not None:
+                    self._check(key, fingerprint, stored[0])
+                    self._put(key, fingerprint, stored[1])
+                    future.set_result(stored[1])
+                    return stored[1], True
+                claimed = True
+
+            result = await operation()
+            self._put(key, fingerprint, result)
+            future.set_result(result)
+        except BaseException as e:
+            if isinstance(e, Exception):
+                # The operation failed before writing, so a retry may run it
+                if claimed:
+                    await self.store.release(key)
+                future.set_exception(e)
+            else:
+                # Cancelled mid-write: the write may still commit, so the
+                # claim is kept until it goes stale rather than released
+                future.cancel()
+            raise
+        finally:
+            self._in_flight.pop(key, None)
+
+        if self.store is not None:
+            try:
+                await self.store.complete(key, result)
+            except Exception as e:
+                # The write already happened: until the result is recorded other
+                # workers get IdempotencyInProgress, so keep trying
+                logger.error(f"Failed to record idempotency key {key}, retrying: {e}")
+                task = asyncio.create_task(self._record(key, result))
+                self._recording.add(task)
+                task.add_done_callback(self._recording.discard)
+
+        return result, False
+
+    async def _record(self, key: str, result: dict):
+        """Retry recording a result, giving up halfway to the claim going stale."""
+        deadline = time.monotonic() + self.store.pending_timeout.total_seconds() / 2
+        delay = RECORD_RETRY_MIN_SECONDS
+        while time.monotonic() + delay < deadline:
+            await asyncio.sleep(delay)
+            try:
+                await self.store.complete(key, result)
+                logger.info(f"Recorded idempotency key {key} after retrying")
+                return
+            except Exception as e:
+                logger.warning(f"Still failing to record idempotency key {key}: {e}")
+            delay = min(delay * 2, RECORD_RETRY_MAX_SECONDS)
+        logger.error(f"Gave up recording idempotency key {key}; a retry after the claim goes stale may run again")
+
+    def _check(self, key: str, fingerprint: str, expected: str):
+        if fingerprint != expected:
+            raise IdempotencyMismatch(key)
+
+    def _get(self, key: str) -> Optional[Tuple[str, dict]]:
+        entry = self._results.get(key)
+        if entry is None:
+            return None
+
+        expires_at, fingerprint, result = entry
+        if expires_at < time.monotonic():
+            del self._results[key]
+            return None
+
+        self._results.move_to_end(key)
+        return fingerprint, result
+
+    def _put(self, key: str, fingerprint: str, result: dict):
+        self._results[key] = (time.monotonic() + self.ttl_seconds, fingerprint, result)
+        self._results.move_to_end(key)
+        while len(self._results) > self.max_entries:
+            self._results.popitem(last=False)
@@ -9,16 +9,22 @@ import os
 sys.path.append(os.path.join(os.path.dirname(__file__), '..'))
 
 from fastapi import FastAPI, Request
-from fastapi.responses import Response
+from fastapi.responses import Response, JSONResponse
+import asyncio
 import logging
 import time
+from typing import Literal
 
 from common.config import settings
 from common.metrics import (
     http_requests_total,
     http_request_duration_seconds,
+    http_request_latency_sketches,
     get_metrics
 )
+from admission import AdmissionController, Rejected, is_exempt, route_class
+from idempotency import SqlIdempotencyStore
+from persistence import ItemLog
 from routes import health, items
 
 # Configure logging
@@ -36,6 +42,127 @@ app = FastAPI(
 )
 
 
+@app.on_event("startup")
+async def restore_items():
+    """
+    Restore the in-memory store before accepting traffic.
+    
+    Uvicorn only starts serving (and readiness probes only pass) once
+    this returns, so a restarted pod is never ready with an empty store.
+    """
+    if not settings.persistence_enabled:
+        return
+    
+    log = ItemLog.open_slot(
+        settings.persistence_dir,
+        slots=settings.workers,
+        commit_delay=settings.log_commit_delay_ms / 1000.0,
+        fsync=settings.log_fsync
+    )
+    await asyncio.to_thread(items.enable_persistence, log)
+    await log.start()
+    
+    app.state.snapshot_task = asyncio.create_task(log.run_snapshots(
+        lambda: items.items_store.values(),
+        interval=settings.snapshot_interval_seconds,
+        min_records=settings.snapshot_min_records
+    ))
+
+
+@app.on_event("startup")
+async def connect_idempotency_store():
+    """Share Idempotency-Key records across workers when configured."""
+    if settings.idempotency_backend != "sql":
+        return
+    
+    store = await asyncio.to_thread(
+        SqlIdempotencyStore.from_url,
+        settings.database_url,
+        settings.idempotency_ttl_seconds,
+        settings.idempotency_pending_timeout_seconds
+    )
+    items.idempotency_cache.store = store
+    app.state.idempotency_purge_task = asyncio.create_task(
+        store.run_purge(settings.idempotency_purge_interval_seconds)
+    )
+
+
+# How often each worker publishes its latency sketches for the others
+SKETCH_PUBLISH_SECONDS = 5
+
+
+async def publish_latency_sketches():
+    while True:
+        try:
+            # Copied on the loop: requests keep recording while the thread serializes
+            series = http_request_latency_sketches.copy_series()
+            await asyncio.to_thread(http_request_latency_sketches.publish, settings.sketch_dir, series)
+        except Exception as e:
+            logger.warning(f"Could not publish latency sketches: {e!r}")
+        await asyncio.sleep(SKETCH_PUBLISH_SECONDS)
+
+
+@app.on_event("startup")
+async def start_sketch_publisher():
+    """Let /metrics/sketches merge the latency of every worker in the pod."""
+    app.state.sketch_task = asyncio.create_task(publish_latency_sketches())
+
+
+@app.on_event("shutdown")
+async def flush_items():
+    """Flush pending log records on graceful shutdown."""
+    if items.item_log is None:
+        return
+    
+    app.state.snapshot_task.cancel()
+    await items.item_log.close()
+
+
+@app.on_event("shutdown")
+async def stop_idempotency_purge():
+    """Stop purging expired idempotency keys."""
+    task = getattr(app.state, "idempotency_purge_task", None)
+    if task is not None:
+        task.cancel()
+
+
+# Admission control (per worker process)
+admission = (
+    AdmissionController(settings.client_id, settings.admission_limits_for(settings.client_id))
+    if settings.admission_enabled else None
+)
+
+
+# Registered before metrics_middleware so it runs inside it:
+# shed requests are still counted and queueing time is included in latency.
+@app.middleware("http")
+async def admission_middleware(request: Request, call_next):
+    """
+    Middleware to shed load before it queues up inside the worker.
+    
+    Rejects with 429 when a route class exceeds its rate limit and with
+    503 when the concurrency queue is full or too slow to drain.
+    """
+    if admission is None or is_exempt(request.url.path):
+        return await call_next(request)
+    
+    try:
+        await admission.acquire(route_class(request.method))
+    except Rejected as e:
+        logger.warning(f"Request shed ({e.reason}): {request.method} {request.url.path}")
+        return JSONResponse(
+            status_code=e.status_code,
+            content={"detail": "Service overloaded, retry later", "reason": e.reason},
+            headers={"Retry-After": str(e.retry_after)}
+        )
+    
+    start_time = time.monotonic()
+    try:
+        return await call_next(request)
+    finally:
+        admission.release(time.monotonic() - start_time)
+
+
 @app.middleware("http")
 async def metrics_middleware(request: Request, call_next):
     """
@@ -44,6 +171,7 @@ async def metrics_middleware(request: Request, call_next):
     Tracks:
     - Total requests by method, endpoint, status
     - Request duration histogram
+    - Sliding-window latency sketch per route template
     """
     start_time = time.time()
     
@@ -65,6 +193,15 @@ async def metrics_middleware(request: Request, call_next):
         client=settings.client_id
     ).observe(duration)
     
+    # Keyed by route template so /api/items/{item_id} is one series
+    route = request.scope.get("route")
+    http_request_latency_sketches.observe(
+        method=request.method,
+        endpoint=route.path if route is not None else "unmatched",
+        client=settings.client_id,
+        seconds=duration
+    )
+    
     return response
 
 
@@ -85,6 +222,30 @@ async def metrics():
     return Response(content=metrics_content, media_type=content_type)
 
 
+@app.get("/metrics/sketches")
+async def metrics_sketches(window: Literal["1m", "5m"] = "5m"):
+    """
+    Latency sketches per route for the given window, merged across the
+    workers of this pod.
+    
+    Sketches from different replicas can be merged the same way
+    (DDSketch.from_dict + merge) to compute fleet-wide percentiles; the
+    metrics collector does this and pushes the result to Zabbix.
+    """
+    workers, series = await asyncio.to_thread(
+        http_request_latency_sketches.export_merged,
+        window,
+        settings.sketch_dir,
+        SKETCH_PUBLISH_SECONDS * 3,
+        http_request_latency_sketches.copy_series()
+    )
+    return {
+        "client": settings.client_id,
+        "workers": workers,
+        "series": series
+    }
+
+
 @app.get("/")
 async def root():
     """Root endpoint with API information."""
@@ -34,3 +34,23 @@ class Item(Base):
     
     def __repr__(self):
         return f"<Item(id={self.id}, name='{self.name}', category='{self.category}')>"
+
+
+class IdempotencyRecord(Base):
+    """
+    Result of a request made with an Idempotency-Key header.
+    
+    Shared by all workers so a retried request is recognised no matter
+    which worker receives it. A row without a response is a request
+    still being processed.
+    """
+    __tablename__ = "idempotency_keys"
+    
+    key = Column(String(255), primary_key=True)
+    fingerprint = Column(String(64), nullable=False)
+    response = Column(Text, nullable=True)
+    created_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
+    
+    def __repr__(self):
+        return f"<IdempotencyRecord(key='{self.key}', completed={self.response is not None})>"
@@ -0,0 +1,375 @@
+"""
+Durable persistence for the in-memory item store.
+
+Every mutation is appended to a log before the request returns. Appends
+from concurrent requests are group-committed: one write + fsync covers
+every record queued while the previous batch was on disk.
+
+Periodic snapshots capture the whole store so the log can be truncated.
+On startup the newest snapshot is memory-mapped and loaded, then the log
+tail written after it is replayed.
+
+Directory layout (one slot per worker process):
+    <base>/worker-<n>/LOCK
+    <base>/worker-<n>/snapshot-<seq>.snap
+    <base>/worker-<n>/log-<first seq>.log
+
+Each worker process keeps its own in-memory store, so each one owns a
+slot directory, claimed with an exclusive file lock.
+
+After a failed write the log refuses further appends (fails closed):
+the disk state is uncertain, and a later record written after a torn one
+would be cut off on restore. The pod has to be restarted to recover.
+"""
+import asyncio
+import fcntl
+import json
+import logging
+import mmap
+import os
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_VERSION = 1
+DATETIME_FIELDS = ("created_at", "updated_at")
+
+
+def _encode(record: dict) -> bytes:
+    return json.dumps(record, default=datetime.isoformat, separators=(",", ":")).encode() + b"\n"
+
+
+def _decode_item(item: dict) -> dict:
+    for field in DATETIME_FIELDS:
+        item[field] = datetime.fromisoformat(item[field])
+    return item
+
+
+def _fsync_directory(path: Path):
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
+
+
+def _seq_of(path: Path) -> int:
+    return int(path.stem.split("-", 1)[1])
+
+
+class LogFailed(OSError):
+    """The log stopped accepting records after a write failure."""
+
+
+class ItemLog:
+    """
+    Append-only log with group commit and snapshot compaction.
+
+    Usage:
+        log = ItemLog.open_slot("/var/lib/msp-api", slots=4)
+        items, last_seq = log.restore()
+        await log.start()
+        ...
+        await log.append("update", item)   # returns once durable
+        ...
+        await log.close()
+    """
+
+    def __init__(self, directory, commit_delay: float = 0.0, fsync: bool = True):
+        self.directory = Path(directory)
+        self.commit_delay = commit_delay
+        self.fsync = fsync
+
+        self.seq = 0
+        self.snapshot_seq = 0
+        self._pending = []
+        self._wakeup: Optional[asyncio.Event] = None
+        self._io_lock: Optional[asyncio.Lock] = None
+        self._flusher: Optional[asyncio.Task] = None
+        self._segment = None
+        self._lock_file = None
+        # First write error; once set, every append fails
+        self.failed: Optional[OSError] = None
+
+    @classmethod
+    def open_slot(cls, base_directory, slots: int, **kwargs) -> "ItemLog":
+        """
+        Claim the first free worker slot under base_directory.
+
+        Raises:
+            RuntimeError: If every slot is locked by another process
+        """
+        base = Path(base_directory)
+        for slot in range(max(slots, 1)):
+            directory = base / f"worker-{slot}"
+            directory.mkdir(parents=True, exist_ok=True)
+            lock_file = open(directory / "LOCK", "a")
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                lock_file.close()
+                continue
+
+            log = cls(directory, **kwargs)
+            log._lock_file = lock_file
+            logger.info(f"Persistence slot claimed: {directory}")
+            return log
+
+        raise RuntimeError(f"No free persistence slot in {base} (slots={slots})")
+
+    # Restore
+
+    def restore(self) -> Tuple[Dict[int, dict], int]:
+        """
+        Load the newest snapshot and replay the log written after it.
+
+        Returns:
+            tuple: (items by id, last sequence number)
+        """
+        started = time.monotonic()
+        self.directory.mkdir(parents=True, exist_ok=True)
+        items: Dict[int, dict] = {}
+
+        for path in sorted(self.directory.glob("snapshot-*.snap"), key=_seq_of, reverse=True):
+            try:
+                items, self.snapshot_seq = self._load_snapshot(path)
+                break
+            except (ValueError, KeyError) as e:
+                logger.error(f"Skipping unreadable snapshot {path.name}: {e}")
+                items = {}
+
+        self.seq = self.snapshot_seq
+        replayed = 0
+        for path in sorted(self.directory.glob("log-*.log"), key=_seq_of):
+            with open(path, "rb") as f:
+                offset = 0
+                for line in f:
+                    try:
+                        if not line.endswith(b"\n"):
+                            raise ValueError("missing newline")
+                        record = json.loads(line)
+                    except ValueError:
+                        # Torn write from a crash mid-batch: it was never acknowledged.
+                        # Cut it off so records appended after restart stay readable.
+                        logger.warning(f"Truncating torn record in {path.name} at byte {offset}")
+                        os.truncate(path, offset)
+                        break
+                    offset += len(line)
+                    if record["seq"] <= self.seq:
+                        continue
+                    item = _decode_item(record["item"])
+                    items[item["id"]] = item
+                    self.seq = record["seq"]
+                    replayed += 1
+
+        logger.info(
+            f"Restored {len(items)} items (snapshot seq {self.snapshot_seq}, "
+            f"{replayed} log records) in {time.monotonic() - started:.3f}s"
+        )
+        return items, self.seq
+
+    def _load_snapshot(self, path: Path) -> Tuple[Dict[int, dict], int]:
+        items = {}
+        with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            end = data.find(b"\n")
+            header = json.loads(data[:end])
+            if header["version"] != SNAPSHOT_VERSION:
+                raise ValueError(f"unsupported snapshot version {header['version']}")
+
+            position = end + 1
+            size = len(data)
+            while position < size:
+                end = data.find(b"\n", position)
+                if end < 0:
+                    raise ValueError("snapshot is truncated")
+                item = _decode_item(json.loads(data[position:end]))
+                items[item["id"]] = item
+                position = end + 1
+
+        if len(items) != header["count"]:
+            raise ValueError(f"expected {header['count']} items, found {len(items)}")
+        return items, header["seq"]
+
+    # Append
+
+    async def start(self):
+        """Open a new log segment and start the group-commit task."""
+        self._wakeup = asyncio.Event()
+        self._io_lock = asyncio.Lock()
+        self._open_segment(self.seq + 1)
+        self._flusher = asyncio.create_task(self._flush_loop())
+
+    def append(self, op: str, item: dict, apply: Optional[Callable[[], None]] = None) -> asyncio.Future:
+        """
+        Queue a mutation for the log.
+
+        The record is sequenced immediately. Await the returned future to
+        wait until the record is durable.
+
+        Args:
+            op: Mutation name
+            item: New version of the item
+            apply: Called once the record is durable, before any waiter
+                resumes or a snapshot reads the store, and even if the
+                caller stopped waiting. Not called if the write fails.
+
+        Raises:
+            LogFailed: If an earlier write failed
+        """
+        if self.failed is not None:
+            raise LogFailed(f"Item log failed: {self.failed}")
+        self.seq += 1
+        future = asyncio.get_running_loop().create_future()
+        self._pending.append((_encode({"seq": self.seq, "op": op, "item": item}), future, apply))
+        self._wakeup.set()
+        return future
+
+    async def _flush_loop(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            if self.commit_delay:
+                # Optionally hold the batch open for more requests; records
+                # queued during the previous write are batched regardless
+                await asyncio.sleep(self.commit_delay)
+            async with self._io_lock:
+                await self._flush_pending()
+
+    async def _flush_pending(self):
+        batch, self._pending = self._pending, []
+        if not batch:
+            return
+
+        error = self.failed
+        if error is None:
+            try:
+                await asyncio.to_thread(self._write, b"".join(record for record, _, _ in batch))
+            except OSError as e:
+                logger.error(f"Log write failed, refusing further writes until restart: {e}")
+                self.failed = error = e
+
+        # Apply the whole batch in log order within this step, so the store
+        # already holds every durable record when the I/O lock is released
+        for _, future, apply in batch:
+            if error is None and apply is not None:
+                try:
+                    apply()
+                except Exception as e:
+                    logger.exception("Applying a durable log record failed")
+                    if not future.done():
+                        future.set_exception(e)
+                    continue
+            if future.done():
+                continue
+            if error is None:
+                future.set_result(None)
+            else:
+                future.set_exception(LogFailed(f"Item log failed: {error}"))
+
+    def _write(self, data: bytes):
+        start = self._segment.tell()
+        try:
+            view = memoryview(data)
+            while view:
+                view = view[self._segment.write(view):]
+            if self.fsync:
+                os.fsync(self._segment.fileno())
+        except OSError:
+            # Drop whole records of the failed batch so a restart does not
+            # replay writes that were reported as failed
+            try:
+                os.ftruncate(self._segment.fileno(), start)
+                os.fsync(self._segment.fileno())
+            except OSError as e:
+                logger.error(f"Could not roll back failed log write: {e}")
+            raise
+
+    def _open_segment(self, first_seq: int):
+        if self._segment is not None:
+            self._segment.close()
+        path = self.directory / f"log-{first_seq:020d}.log"
+        # Unbuffered, so a failed write leaves nothing queued in a buffer
+        self._segment = open(path, "ab", buffering=0)
+        _fsync_directory(self.directory)
+
+    # Snapshot
+
+    async def snapshot(self, items: Iterable[dict]):
+        """
+        Write a snapshot of the store and drop log segments it covers.
+
+        Items must never be changed in place (the store replaces them with
+        new versions), so only references are collected on the event loop
+        and serialization happens in a thread. Records must be appended
+        with an `apply` callback: the snapshot covers every sequenced
+        record, so their items must be in the store once they are flushed.
+
+        Args:
+            items: Live view of the store contents, read after the flush
+        """
+        async with self._io_lock:
+            await self._flush_pending()
+            if self.failed is not None:
+                raise LogFailed(f"Item log failed: {self.failed}")
+            seq = self.seq
+            records = list(items)
+            self._open_segment(seq + 1)
+
+        started = time.monotonic()
+        path = await asyncio.to_thread(self._write_snapshot, records, seq)
+        self.snapshot_seq = seq
+
+        for old in self.directory.glob("snapshot-*.snap"):
+            if old != path:
+                old.unlink()
+        for old in self.directory.glob("log-*.log"):
+            if _seq_of(old) <= seq:
+                old.unlink()
+
+        logger.info(f"Snapshot of {len(records)} items at seq {seq} in {time.monotonic() - started:.3f}s")
+
+    def _write_snapshot(self, records: list, seq: int) -> Path:
+        path = self.directory / f"snapshot-{seq:020d}.snap"
+        temporary = path.with_suffix(".tmp")
+        with open(temporary, "wb") as f:
+            f.write(_encode({"version": SNAPSHOT_VERSION, "seq": seq, "count": len(records)}))
+            for record in records:
+                f.write(_encode(record))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+        _fsync_directory(self.directory)
+        return path
+
+    async def run_snapshots(self, get_items, interval: float, min_records: int):
+        """Snapshot every `interval` seconds once `min_records` mutations have accumulated."""
+        while True:
+            await asyncio.sleep(interval)
+            if self.seq - self.snapshot_seq < min_records:
+                continue
+            try:
+                await self.snapshot(get_items())
+            except OSError as e:
+                logger.error(f"Snapshot failed: {e}")
+
+    async def close(self):
+        """Flush pending records and release the slot."""
+        if self._flusher is not None:
+            # Holding the lock means no batch is half-written when the flusher stops
+            async with self._io_lock:
+                self._flusher.cancel()
+                await self._flush_pending()
+            try:
+                await self._flusher
+            except asyncio.CancelledError:
+                pass
+            self._segment.close()
+            self._segment = None
+            self._flusher = None
+
+        if self._lock_file is not None:
+            self._lock_file.close()
+            self._lock_file = None
@@ -7,8 +7,11 @@ These endpoints are used by:
 - Load balancer health checks
 """
 from fastapi import APIRouter, status
+from fastapi.responses import JSONResponse
 from datetime import datetime
 
+from routes import items
+
 router = APIRouter()
 
 
@@ -38,7 +41,19 @@ async def readiness_check():
     - Database connectivity
     - External service availability
     - Cache readiness
+    
+    Not ready once the item log has failed, since writes are refused.
     """
+    if items.item_log is not None and items.item_log.failed is not None:
+        return JSONResponse(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            content={
+                "status": "not ready",
+                "reason": "item log failed",
+                "timestamp": datetime.utcnow().isoformat()
+            }
+        )
+    
     return {
         "status": "ready",
         "timestamp": datetime.utcnow().isoformat()
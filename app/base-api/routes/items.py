@@ -4,12 +4,24 @@ CRUD endpoints for items.
 Generic REST API that works for all clients.
 Context (e-commerce, fintech, saas) is determined by CLIENT_ID env variable.
 """
-from fastapi import APIRouter, HTTPException, status, Depends
+from fastapi import APIRouter, HTTPException, status, Depends, Query, Header, Response, WebSocket
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
+import asyncio
+import hashlib
+import json
 import logging
 
+from common.config import settings
+from changefeed import ChangeFeed, SubscriberEvicted
+from idempotency import IdempotencyCache, IdempotencyInProgress, IdempotencyMismatch
+from persistence import ItemLog
+from search import NameIndex
+from stats import ItemStats
+
 router = APIRouter(prefix="/api")
 logger = logging.getLogger(__name__)
 
@@ -34,14 +46,130 @@ class ItemResponse(BaseModel):
     updated_at: datetime
 
 
+class GroupStats(BaseModel):
+    """Aggregate statistics of item values for one group."""
+    group: Optional[str]
+    count: int
+    sum: float
+    min: float
+    max: float
+    mean: float
+    quantiles: Dict[str, Optional[float]]
+    sketch: Optional[dict] = None
+
+
+class StatsResponse(BaseModel):
+    """Response model for item statistics."""
+    group_by: str
+    groups: List[GroupStats]
+
+
 # In-memory storage for demo purposes
 # In production, this would be SQLAlchemy database operations
 items_store = {}
 item_counter = 0
 
+# Search index over names of active items, kept in sync by the routes below
+name_index = NameIndex()
+
+# Value aggregates per category/status, kept in sync by the routes below
+item_stats = ItemStats()
+
+# Change events for streaming clients, published once a mutation is committed
+change_feed = ChangeFeed(
+    settings.client_id,
+    history=settings.change_feed_history,
+    queue_size=settings.change_feed_queue_size
+)
+
+# Responses of create requests sent with an Idempotency-Key, so retries
+# get the original item back instead of creating a duplicate
+idempotency_cache = IdempotencyCache(
+    max_entries=settings.idempotency_max_entries,
+    ttl_seconds=settings.idempotency_ttl_seconds
+)
+
+# Seconds between SSE comments that keep idle connections open
+SSE_KEEPALIVE_SECONDS = 15
+
+# Durable log of mutations, set by enable_persistence() when configured
+item_log: Optional[ItemLog] = None
+
+
+def load_items(items: dict):
+    """Replace the store contents and rebuild the derived indexes."""
+    global item_counter
+    items_store.clear()
+    items_store.update(items)
+    
+    name_index.rebuild(
+        (item_id, item["name"]) for item_id, item in items_store.items()
+        if item["status"] == "active"
+    )
+    item_stats.clear()
+    for item in items_store.values():
+        item_stats.add(item)
+    item_counter = max(items_store, default=0)
+
+
+def enable_persistence(log: ItemLog):
+    """Restore the store from a log and record every later mutation to it."""
+    global item_log
+    items, _ = log.restore()
+    load_items(items)
+    item_log = log
+
+
+def _apply(item: dict):
+    """Put an item version in the store and keep the derived indexes in sync."""
+    item_id = item["id"]
+    previous = items_store.get(item_id)
+    items_store[item_id] = item
+    
+    if item["status"] == "active":
+        name_index.add(item_id, item["name"])
+    else:
+        name_index.remove(item_id)
+    
+    if previous is None:
+        item_stats.add(item)
+    elif any(previous[field] != item[field] for field in ("category", "status", "value")):
+        item_stats.update(previous, item)
+
+
+async def _commit(op: str, item: dict):
+    """
+    Make a mutation durable, apply it, then announce it on the change feed.
+    
+    Items are never changed in place: callers pass a new version, which
+    only becomes visible once it is on disk, so a failed write leaves
+    nothing behind. The log applies versions in log order as each batch
+    becomes durable, before a snapshot can read the store.
+    """
+    def apply():
+        previous = items_store.get(item["id"])
+        _apply(item)
+        change_feed.publish(change_feed.prepare(op, item, previous))
+    
+    if item_log is None:
+        apply()
+        return
+    
+    try:
+        await item_log.append(op, item, apply=apply)
+    except OSError:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Item log is unavailable, write was not applied"
+        )
+
 
 @router.post("/items", response_model=ItemResponse, status_code=status.HTTP_201_CREATED)
-async def create_item(item: ItemCreate):
+async def create_item(
+    item: ItemCreate,
+    response: Response,
+    idempotency_key: Optional[str] = Header(default=None, min_length=1, max_length=255)
+):
     """
     Create a new item.
     
@@ -49,7 +177,38 @@ async def create_item(item: ItemCreate):
     - Cliente A: Creating products
     - Cliente B: Recording transactions
     - Cliente C: Adding contacts/deals
+    
+    Retries sent with the same Idempotency-Key header return the item
+    created by the first request, marked with Idempotent-Replayed: true.
     """
+    if idempotency_key is None:
+        return await _create_item(item)
+    
+    async def create():
+        return jsonable_encoder(await _create_item(item))
+    
+    fingerprint = hashlib.sha256(item.model_dump_json().encode()).hexdigest()
+    try:
+        result, replayed = await idempotency_cache.execute(idempotency_key, fingerprint, create)
+    except IdempotencyMismatch:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="Idempotency-Key was already used with a different request body"
+        )
+    except IdempotencyInProgress:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="A request with this Idempotency-Key is still being processed",
+            headers={"Retry-After": "1"}
+        )
+    
+    if replayed:
+        response.headers["Idempotent-Replayed"] = "true"
+    return result
+
+
+async def _create_item(item: ItemCreate) -> dict:
+    """Store a new item and commit it."""
     global item_counter
     item_counter += 1
     
@@ -64,8 +223,8 @@ async def create_item(item: ItemCreate):
         "updated_at": datetime.utcnow()
     }
     
-    items_store[item_counter] = new_item
-    logger.info(f"Item created: {item_counter}")
+    await _commit("create", new_item)
+    logger.info(f"Item created: {new_item['id']}")
     
     return new_item
 
@@ -96,6 +255,148 @@ async def list_items(
     return filtered_items[:limit]
 
 
+@router.get("/items/search", response_model=List[ItemResponse])
+async def search_items(
+    q: str = Query(..., min_length=1, max_length=255),
+    category: Optional[str] = None,
+    limit: int = Query(default=20, ge=1, le=100)
+):
+    """
+    Search active items by name.
+    
+    Query parameters:
+    - q: Search term, case-insensitive (prefix match below 3 characters)
+    - category: Filter by category
+    - limit: Maximum items to return (default: 20)
+    
+    Results are ranked: exact match, then prefix, then substring.
+    """
+    def in_category(item_id: int) -> bool:
+        return items_store[item_id].get("category") == category
+    
+    item_ids = name_index.search(q, limit=limit, predicate=in_category if category else None)
+    
+    logger.info(f"Search '{q}' returned {len(item_ids)} items")
+    return [items_store[item_id] for item_id in item_ids]
+
+
+@router.get("/items/stats", response_model=StatsResponse)
+async def get_item_stats(
+    group_by: Literal["category", "status"] = "category",
+    status: Optional[str] = "active",
+    include_sketch: bool = False
+):
+    """
+    Aggregate item values per group.
+    
+    Query parameters:
+    - group_by: Group by category or status (default: category)
+    - status: Only include items with this status (default: active,
+      same as GET /items; pass an empty value to include every status)
+    - include_sketch: Include the mergeable quantile sketch per group
+    
+    Returns count, sum, min, max, mean and approximate p50/p90/p99
+    of value. Served from incrementally maintained aggregates.
+    """
+    groups = item_stats.summarize(group_by, status=status, include_sketch=include_sketch)
+    
+    logger.info(f"Stats computed for {len(groups)} groups")
+    return {"group_by": group_by, "groups": groups}
+
+
+@router.get("/items/changes")
+async def stream_changes(
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None,
+    last_event_id: Optional[str] = Header(default=None)
+):
+    """
+    Stream item changes as Server-Sent Events.
+    
+    Query parameters:
+    - category: Only changes to items in this category
+    - status: Only changes leaving items in this status
+    - since: Resume after this event id (or send Last-Event-ID)
+    
+    Each event carries {"id", "seq", "op", "item"} with op
+    create/update/delete. A "reset" event means changes were missed (or
+    the id came from another worker, replica or before a restart) and the
+    client should re-list; an "evicted" event means the client fell behind
+    and should reconnect from the last id it received.
+    """
+    subscription = change_feed.subscribe(
+        since=last_event_id if last_event_id is not None else since,
+        category=category,
+        status=status
+    )
+    
+    async def events():
+        try:
+            while True:
+                try:
+                    event = await asyncio.wait_for(subscription.get(), SSE_KEEPALIVE_SECONDS)
+                except asyncio.TimeoutError:
+                    yield ": keepalive\n\n"
+                    continue
+                except SubscriberEvicted:
+                    yield 'event: evicted\ndata: {"op": "evicted"}\n\n'
+                    return
+                yield f"id: {event.id}\nevent: {event.op}\ndata: {event.data}\n\n"
+        finally:
+            change_feed.unsubscribe(subscription)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.websocket("/items/changes/ws")
+async def stream_changes_ws(
+    websocket: WebSocket,
+    category: Optional[str] = None,
+    status: Optional[str] = None,
+    since: Optional[str] = None
+):
+    """
+    Stream item changes over a WebSocket.
+    
+    Same filters, resume semantics and message format as /items/changes.
+    The server closes with code 1013 (try again later) after eviction.
+    """
+    await websocket.accept()
+    subscription = change_feed.subscribe(since=since, category=category, status=status)
+    disconnected = asyncio.create_task(_wait_for_disconnect(websocket))
+    
+    try:
+        while True:
+            next_event = asyncio.create_task(subscription.get())
+            await asyncio.wait({next_event, disconnected}, return_when=asyncio.FIRST_COMPLETED)
+            if disconnected.done():
+                next_event.cancel()
+                return
+            try:
+                event = next_event.result()
+            except SubscriberEvicted:
+                await websocket.send_text(json.dumps({"op": "evicted"}))
+                await websocket.close(code=1013)
+                return
+            await websocket.send_text(event.data)
+    finally:
+        disconnected.cancel()
+        change_feed.unsubscribe(subscription)
+
+
+async def _wait_for_disconnect(websocket: WebSocket):
+    """Return once the client closes; incoming messages are ignored."""
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
+
 @router.get("/items/{item_id}", response_model=ItemResponse)
 async def get_item(item_id: int):
     """Get single item by ID."""
@@ -122,16 +423,18 @@ async def update_item(item_id: int, item: ItemCreate):
             detail=f"Item {item_id} not found"
         )
     
-    existing_item.update({
+    updated_item = {
+        **existing_item,
         "name": item.name,
         "description": item.description,
         "value": item.value,
         "category": item.category,
         "updated_at": datetime.utcnow()
-    })
+    }
+    await _commit("update", updated_item)
     
     logger.info(f"Item updated: {item_id}")
-    return existing_item
+    return updated_item
 
 
 @router.delete("/items/{item_id}", status_code=status.HTTP_204_NO_CONTENT)
@@ -145,8 +448,7 @@ async def delete_item(item_id: int):
             detail=f"Item {item_id} not found"
         )
     
-    item["status"] = "inactive"
-    item["updated_at"] = datetime.utcnow()
+    await _commit("delete", {**item, "status": "inactive", "updated_at": datetime.utcnow()})
     
     logger.info(f"Item deleted: {item_id}")
     return None
@@ -0,0 +1,219 @@
+"""
+Name search for items.
+
+The in-memory store uses NameIndex, a trigram inverted index kept in sync
+by the item routes.
+
+Ranking (best first):
+- exact name match
+- name starts with the query
+- name contains the query (earlier match position first)
+Ties go to shorter names, then lower ids.
+"""
+import heapq
+from array import array
+from collections import defaultdict
+from typing import Callable, Iterable, List, Optional, Tuple
+
+# Pads the start of a name so prefixes get their own anchored grams
+PAD = "\x02"
+
+# Ranking tiers
+EXACT, PREFIX, SUBSTRING = 0, 1, 2
+
+
+def _grams(text: str) -> set:
+    """Trigrams of text, including the two start-anchored grams."""
+    padded = PAD * 2 + text
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+def _query_grams(term: str) -> set:
+    """Trigrams every name containing term must also contain."""
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+def _prefix_gram(term: str) -> str:
+    """Start-anchored gram every name starting with term must contain."""
+    return (PAD * 2 + term)[-3:] if len(term) < 3 else PAD + term[:2]
+
+
+class NameIndex:
+    """
+    Trigram index over item names, case-insensitive.
+
+    Postings are compact integer arrays that are only ever appended to.
+    Renames and removals leave stale ids behind, which lookups discard by
+    checking the current name; the index is rebuilt once stale entries
+    outnumber live ones.
+
+    Queries shorter than three characters match name prefixes only.
+    """
+
+    def __init__(self, max_candidates: int = 10000):
+        self.max_candidates = max_candidates
+        self._names = {}
+        self._postings = {}
+        self._live = 0
+        self._stale = 0
+
+    def __len__(self):
+        return len(self._names)
+
+    def add(self, item_id: int, name: str):
+        """Index a new item, or re-index an existing one after a rename."""
+        key = name.lower()
+        previous = self._names.get(item_id)
+        if previous == key:
+            return
+
+        grams = _grams(key)
+        new_grams = grams
+        if previous is not None:
+            previous_grams = _grams(previous)
+            new_grams = grams - previous_grams
+            self._live -= len(previous_grams)
+            self._stale += len(previous_grams - grams)
+
+        for gram in new_grams:
+            posting = self._postings.get(gram)
+            if posting is None:
+                posting = self._postings[gram] = array("q")
+            posting.append(item_id)
+
+        self._names[item_id] = key
+        self._live += len(grams)
+        self._maybe_compact()
+
+    def remove(self, item_id: int):
+        """Drop an item from the index."""
+        previous = self._names.pop(item_id, None)
+        if previous is None:
+            return
+
+        count = len(_grams(previous))
+        self._live -= count
+        self._stale += count
+        self._maybe_compact()
+
+    def clear(self):
+        self._names.clear()
+        self._postings.clear()
+        self._live = 0
+        self._stale = 0
+
+    def rebuild(self, entries: Iterable[Tuple[int, str]]):
+        """Replace the index contents with (item_id, name) pairs in one pass."""
+        self.clear()
+        names = self._names
+        postings = defaultdict(list)
+
+        for item_id, name in entries:
+            key = names[item_id] = name.lower()
+            grams = _grams(key)
+            self._live += len(grams)
+            for gram in grams:
+                postings[gram].append(item_id)
+
+        self._postings = {gram: array("q", ids) for gram, ids in postings.items()}
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        predicate: Optional[Callable[[int], bool]] = None
+    ) -> List[int]:
+        """
+        Return up to `limit` matching item ids, best match first.
+
+        Args:
+            query: Search term (case-insensitive)
+            limit: Maximum ids to return
+            predicate: Optional filter applied to each matching id
+
+        Exact and prefix matches are always found in full. Substring
+        matches are only looked for if those leave room under `limit`,
+        and very broad queries stop once max_candidates of them passed
+        the predicate.
+        """
+        term = query.lower()
+        if not term or limit <= 0:
+            return []
+
+        prefix_posting = self._postings.get(_prefix_gram(term), ())
+        if len(term) < 3:
+            return self._rank(self._scan(prefix_posting, term, predicate, prefix_only=True), limit)
+
+        query_postings = [self._postings.get(g) for g in _query_grams(term)]
+        if not all(query_postings):
+            return []
+        # Every match contains every query gram, so the rarest one is enough
+        rarest = min(query_postings, key=len)
+        if len(rarest) <= max(self.max_candidates, len(prefix_posting)):
+            return self._rank(self._scan(rarest, term, predicate), limit)
+
+        # Too broad to check every candidate: every prefix match carries the
+        # start-anchored gram, so rank those first and only top up with
+        # substring matches from the rarest posting
+        matches = self._scan(prefix_posting, term, predicate, prefix_only=True)
+        if len(matches) < limit:
+            matches += self._scan(rarest, term, predicate, substring_only=True, budget=self.max_candidates)
+        return self._rank(matches, limit)
+
+    def _scan(
+        self,
+        posting,
+        term: str,
+        predicate: Optional[Callable[[int], bool]],
+        prefix_only: bool = False,
+        substring_only: bool = False,
+        budget: Optional[int] = None
+    ) -> List[Tuple[int, int, int, int]]:
+        """
+        Check the ids of a posting against term.
+
+        Returns (tier, position, name length, id) for each match. Only
+        matches that pass the predicate count against `budget`.
+        """
+        names = self._names
+        seen = set()
+        matches = []
+
+        for item_id in posting:
+            if item_id in seen:
+                continue
+            seen.add(item_id)
+
+            name = names.get(item_id)
+            if name is None:
+                continue
+            position = name.find(term)
+            if position < 0 or (prefix_only and position > 0) or (substring_only and position == 0):
+                continue
+            if predicate is not None and not predicate(item_id):
+                continue
+
+            if position > 0:
+                tier = SUBSTRING
+            elif len(name) == len(term):
+                tier = EXACT
+            else:
+                tier = PREFIX
+            matches.append((tier, position, len(name), item_id))
+
+            if budget is not None and len(matches) >= budget:
+                break
+
+        return matches
+
+    @staticmethod
+    def _rank(matches: List[Tuple[int, int, int, int]], limit: int) -> List[int]:
+        return [match[3] for match in heapq.nsmallest(limit, matches)]
+
+    def _maybe_compact(self):
+        if self._stale > max(self._live, 1024):
+            self._rebuild()
+
+    def _rebuild(self):
+        self.rebuild(list(self._names.items()))
+
@@ -0,0 +1,189 @@
+"""
+Incrementally maintained aggregates over item values.
+
+Aggregates are kept per (category, status) cell and updated on every
+create, update and soft delete, so a stats request only merges a handful
+of cells instead of scanning every item.
+
+Quantiles come from DDSketch, so per-worker results can be combined by
+merging the serialized sketches.
+"""
+import heapq
+import math
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from common.sketch import DDSketch
+
+QUANTILES = {"p50": 0.5, "p90": 0.9, "p99": 0.99}
+
+
+class _Extremes:
+    """
+    Min and max of a multiset that supports removal (lazy-deletion heaps).
+
+    Removed values stay in the heaps until they reach the top; once they
+    outnumber live values the heaps are rebuilt, so memory follows the
+    number of items rather than the number of updates.
+    """
+
+    def __init__(self):
+        self._low = []
+        self._high = []
+        self._removed_low = Counter()
+        self._removed_high = Counter()
+        # Removed values still sitting in each heap
+        self._pending_low = 0
+        self._pending_high = 0
+
+    def __len__(self) -> int:
+        return len(self._low) - self._pending_low
+
+    def add(self, value: float):
+        heapq.heappush(self._low, value)
+        heapq.heappush(self._high, -value)
+
+    def remove(self, value: float):
+        self._removed_low[value] += 1
+        self._removed_high[-value] += 1
+        self._pending_low += 1
+        self._pending_high += 1
+        if max(self._pending_low, self._pending_high) > max(len(self), 16):
+            self._compact()
+
+    def min(self) -> Optional[float]:
+        value, popped = self._peek(self._low, self._removed_low)
+        self._pending_low -= popped
+        return value
+
+    def max(self) -> Optional[float]:
+        value, popped = self._peek(self._high, self._removed_high)
+        self._pending_high -= popped
+        return None if value is None else -value
+
+    def _compact(self):
+        live = Counter(self._low)
+        live.subtract(self._removed_low)
+        self._low = list(live.elements())
+        heapq.heapify(self._low)
+        self._high = [-value for value in self._low]
+        heapq.heapify(self._high)
+        self._removed_low.clear()
+        self._removed_high.clear()
+        self._pending_low = self._pending_high = 0
+
+    @staticmethod
+    def _peek(heap: list, removed: Counter) -> Tuple[Optional[float], int]:
+        popped = 0
+        while heap and removed[heap[0]]:
+            removed[heap[0]] -= 1
+            if not removed[heap[0]]:
+                del removed[heap[0]]
+            heapq.heappop(heap)
+            popped += 1
+        return (heap[0] if heap else None), popped
+
+
+class _Cell:
+    """Aggregates for items sharing one (category, status)."""
+
+    def __init__(self):
+        self.count = 0
+        self.total = 0.0
+        self.extremes = _Extremes()
+        self.sketch = DDSketch()
+
+    def add(self, value: float):
+        self.count += 1
+        self.total += value
+        self.extremes.add(value)
+        self.sketch.add(value)
+
+    def remove(self, value: float):
+        self.count -= 1
+        self.total -= value
+        self.extremes.remove(value)
+        self.sketch.remove(value)
+
+
+class ItemStats:
+    """
+    Aggregate statistics of item values.
+
+    Call add() for new items, remove() for items leaving their current
+    cell, and update() with the item's previous and current state.
+    """
+
+    def __init__(self):
+        self._cells: Dict[Tuple[Optional[str], str], _Cell] = {}
+
+    def add(self, item: dict):
+        key = (item.get("category"), item["status"])
+        cell = self._cells.get(key)
+        if cell is None:
+            cell = self._cells[key] = _Cell()
+        cell.add(item["value"])
+
+    def remove(self, item: dict):
+        key = (item.get("category"), item["status"])
+        cell = self._cells[key]
+        cell.remove(item["value"])
+        if not cell.count:
+            del self._cells[key]
+
+    def update(self, previous: dict, current: dict):
+        self.remove(previous)
+        self.add(current)
+
+    def clear(self):
+        self._cells.clear()
+
+    def summarize(
+        self,
+        group_by: str,
+        status: Optional[str] = None,
+        include_sketch: bool = False
+    ) -> List[dict]:
+        """
+        Merge cells into per-group statistics.
+
+        Args:
+            group_by: "category" or "status"
+            status: Only include items with this status
+            include_sketch: Attach the serialized DDSketch for each group
+
+        Returns:
+            list: One dict per group, ordered by group name
+        """
+        groups = {}
+        for (category, cell_status), cell in self._cells.items():
+            if status and cell_status != status:
+                continue
+            group = category if group_by == "category" else cell_status
+            groups.setdefault(group, []).append(cell)
+
+        results = []
+        for group, cells in sorted(groups.items(), key=lambda g: (g[0] is None, g[0] or "")):
+            count = sum(c.count for c in cells)
+            total = math.fsum(c.total for c in cells)
+
+            sketch = DDSketch()
+            for cell in cells:
+                sketch.merge(cell.sketch)
+
+            result = {
+                "group": group,
+                "count": count,
+                "sum": total,
+                "min": min(c.extremes.min() for c in cells),
+                "max": max(c.extremes.max() for c in cells),
+                "mean": total / count,
+                "quantiles": {
+                    name: sketch.quantile(q) for name, q in QUANTILES.items()
+                }
+            }
+            if include_sketch:
+                result["sketch"] = sketch.to_dict()
+            results.append(result)
+
+        return results
@@ -0,0 +1,12 @@
+"""
+Shared test setup.
+
+The API modules import each other by top-level name (as when run from
+app/base-api), and import common/ from the parent directory.
+"""
+import os
+import sys
+
+BASE_API_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, BASE_API_DIR)
+sys.path.insert(0, os.path.dirname(BASE_API_DIR))
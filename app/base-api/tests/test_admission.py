@@ -0,0 +1,176 @@
+"""Tests for admission control: queueing, read priority, shedding and slot accounting."""
+import asyncio
+
+import pytest
+from fastapi.testclient import TestClient
+
+import main
+from admission import AdmissionController, Rejected, is_exempt
+from common.config import Settings
+
+
+def make_controller(**overrides) -> AdmissionController:
+    limits = {
+        "read_rate": 1000.0,
+        "read_burst": 1000,
+        "write_rate": 1000.0,
+        "write_burst": 1000,
+        "max_concurrency": 1,
+        "max_queue": 8,
+        "queue_target_ms": 1000,
+        **overrides
+    }
+    return AdmissionController("test", limits)
+
+
+def test_released_slot_goes_to_queued_read_before_earlier_write():
+    async def run():
+        controller = make_controller()
+        await controller.acquire("write")
+        admitted = []
+
+        async def request(route_class):
+            await controller.acquire(route_class)
+            admitted.append(route_class)
+
+        write = asyncio.create_task(request("write"))
+        await asyncio.sleep(0)
+        read = asyncio.create_task(request("read"))
+        await asyncio.sleep(0)
+        assert controller.queue_depth == 2
+
+        controller.release(0.001)
+        await asyncio.sleep(0.01)
+        assert admitted == ["read"]
+
+        controller.release(0.001)
+        await asyncio.gather(write, read)
+        assert admitted == ["read", "write"]
+        assert (controller.in_flight, controller.queue_depth) == (1, 0)
+
+    asyncio.run(run())
+
+
+def test_full_queue_is_shed_with_retry_after():
+    async def run():
+        controller = make_controller(max_queue=1)
+        await controller.acquire("read")
+        queued = asyncio.create_task(controller.acquire("read"))
+        await asyncio.sleep(0)
+
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("read")
+
+        assert (rejected.value.reason, rejected.value.status_code) == ("queue_full", 503)
+        assert rejected.value.retry_after == 1
+        controller.release(0.001)
+        await queued
+
+    asyncio.run(run())
+
+
+def test_predicted_queue_delay_is_shed_with_retry_after():
+    async def run():
+        controller = make_controller(queue_target_ms=100)
+        await controller.acquire("write")
+        # Requests have recently held a slot for 2.5s each
+        controller.service_time = 2.5
+
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("write")
+
+        assert (rejected.value.reason, rejected.value.status_code) == ("queue_delay", 503)
+        assert rejected.value.retry_after == 3
+        assert (controller.in_flight, controller.queue_depth) == (1, 0)
+
+    asyncio.run(run())
+
+
+def test_queued_request_times_out_and_leaves_the_queue():
+    async def run():
+        controller = make_controller(queue_target_ms=20)
+        await controller.acquire("write")
+
+        with pytest.raises(Rejected) as rejected:
+            await controller.acquire("read")
+
+        assert (rejected.value.reason, rejected.value.status_code) == ("queue_timeout", 503)
+        assert rejected.value.retry_after == 1
+        assert (controller.in_flight, controller.queue_depth) == (1, 0)
+
+        controller.release(0.001)
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_while_queued_does_not_leak_a_slot():
+    async def run():
+        controller = make_controller()
+        await controller.acquire("write")
+        queued = asyncio.create_task(controller.acquire("read"))
+        await asyncio.sleep(0)
+
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+        assert (controller.in_flight, controller.queue_depth) == (1, 0)
+
+        controller.release(0.001)
+        assert controller.in_flight == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_after_hand_off_gives_the_slot_back():
+    async def run():
+        controller = make_controller()
+        await controller.acquire("write")
+        queued = asyncio.create_task(controller.acquire("read"))
+        await asyncio.sleep(0)
+
+        # The slot is handed over, but the waiter is cancelled before it resumes
+        controller.release(0.001)
+        queued.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await queued
+
+        assert (controller.in_flight, controller.queue_depth) == (0, 0)
+        await controller.acquire("write")
+        assert controller.in_flight == 1
+
+    asyncio.run(run())
+
+
+def test_admission_limits_override_merges_over_defaults(monkeypatch):
+    monkeypatch.setenv("ADMISSION_LIMITS", '{"cliente-b": {"queue_target_ms": 50}, "cliente-d": {"max_queue": 4}}')
+    settings = Settings()
+
+    cliente_b = settings.admission_limits_for("cliente-b")
+    assert cliente_b["queue_target_ms"] == 50
+    assert cliente_b["max_concurrency"] == 64
+
+    # Clients without built-in limits fall back to the default entry
+    cliente_d = settings.admission_limits_for("cliente-d")
+    assert cliente_d["max_queue"] == 4
+    assert cliente_d["read_rate"] == 200.0
+    assert settings.admission_limits_for("cliente-c")["queue_target_ms"] == 500
+
+
+def test_admission_limits_override_rejects_unknown_keys(monkeypatch):
+    monkeypatch.setenv("ADMISSION_LIMITS", '{"cliente-b": {"queue_target": 50}}')
+
+    with pytest.raises(ValueError, match="cliente-b"):
+        Settings()
+
+
+def test_metrics_endpoints_are_not_throttled_while_shedding(monkeypatch):
+    controller = make_controller(read_rate=0, read_burst=1)
+    monkeypatch.setattr(main, "admission", controller)
+    client = TestClient(main.app)
+
+    assert client.get("/api/items").status_code == 200
+    assert client.get("/api/items").status_code == 429
+    for path in ("/metrics", "/metrics/sketches?window=1m", "/health"):
+        assert client.get(path).status_code == 200
+    assert not is_exempt("/metricsx")
@@ -0,0 +1,85 @@
+"""Tests for change feed resume and reset semantics."""
+import asyncio
+
+from changefeed import ChangeFeed
+
+
+def make_item(item_id: int) -> dict:
+    return {"id": item_id, "name": f"Item {item_id}", "category": "books", "status": "active"}
+
+
+def publish(feed: ChangeFeed, count: int):
+    for item_id in range(1, count + 1):
+        feed.publish(feed.prepare("create", make_item(item_id)))
+
+
+def backlog(feed: ChangeFeed, since: str) -> list:
+    async def run():
+        subscription = feed.subscribe(since=since)
+        feed.unsubscribe(subscription)
+        return [(event.op, event.seq) for event in subscription.backlog]
+
+    return asyncio.run(run())
+
+
+def test_resume_delivers_events_after_own_id():
+    feed = ChangeFeed("test")
+    publish(feed, 5)
+
+    assert backlog(feed, f"{feed.epoch}-3") == [("create", 4), ("create", 5)]
+    assert backlog(feed, f"{feed.epoch}-5") == []
+
+
+def test_id_ahead_of_feed_gets_reset():
+    feed = ChangeFeed("test")
+    publish(feed, 5)
+
+    assert backlog(feed, f"{feed.epoch}-500") == [("reset", 5)]
+
+
+def test_id_from_another_process_gets_reset():
+    feed = ChangeFeed("test")
+    other = ChangeFeed("test")
+    publish(feed, 5)
+    publish(other, 2)
+
+    # Same seq range, different worker or an earlier run of this one
+    assert backlog(feed, f"{other.epoch}-2") == [("reset", 5)]
+    assert backlog(feed, "2") == [("reset", 5)]
+
+
+def test_resume_past_history_gets_reset_then_remaining_events():
+    feed = ChangeFeed("test", history=3)
+    publish(feed, 6)
+
+    assert backlog(feed, f"{feed.epoch}-1") == [("reset", 3), ("create", 4), ("create", 5), ("create", 6)]
+
+
+
+def test_filtered_subscribers_see_items_leave_their_view():
+    async def run():
+        feed = ChangeFeed("test")
+        book = make_item(1)
+        deleted = dict(book, status="inactive")
+        other = make_item(2)
+
+        feed.publish(feed.prepare("create", book))
+        live = feed.subscribe(category="books", status="active")
+        feed.publish(feed.prepare("delete", deleted, book))
+        # Out of the view before and after the change: not delivered
+        feed.publish(feed.prepare("update", dict(deleted, name="Renamed"), deleted))
+        feed.publish(feed.prepare("create", other))
+        feed.publish(feed.prepare("update", dict(other, category="music"), other))
+
+        resumed = feed.subscribe(since=f"{feed.epoch}-1", category="books", status="active")
+        replayed = [(event.op, event.seq) for event in resumed.backlog]
+        streamed = []
+        for _ in range(3):
+            event = await asyncio.wait_for(live.get(), timeout=1)
+            streamed.append((event.op, event.seq))
+        feed.unsubscribe(live)
+        feed.unsubscribe(resumed)
+        return replayed, streamed
+
+    replayed, streamed = asyncio.run(run())
+    assert replayed == streamed == [("delete", 2), ("create", 4), ("update", 5)]
@@ -0,0 +1,194 @@
+"""Tests for Idempotency-Key replay, mismatch, coalescing and the SQL store."""
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import idempotency
+from common.config import Settings
+from idempotency import IdempotencyCache, IdempotencyInProgress, IdempotencyMismatch, SqlIdempotencyStore
+from models import IdempotencyRecord
+from routes import items
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(items.router)
+    return TestClient(app)
+
+
+def test_retry_with_same_key_replays_created_item(client):
+    body = {"name": "Invoice 1", "value": 10.0, "category": "payments"}
+    headers = {"Idempotency-Key": "replay-1"}
+
+    first = client.post("/api/items", json=body, headers=headers)
+    retry = client.post("/api/items", json=body, headers=headers)
+
+    assert first.status_code == retry.status_code == 201
+    assert retry.json() == first.json()
+    assert "Idempotent-Replayed" not in first.headers
+    assert retry.headers["Idempotent-Replayed"] == "true"
+    assert client.get(f"/api/items/{first.json()['id'] + 1}").status_code == 404
+
+
+def test_same_key_with_other_body_is_rejected(client):
+    headers = {"Idempotency-Key": "mismatch-1"}
+    client.post("/api/items", json={"name": "A", "value": 1.0, "category": "books"}, headers=headers)
+
+    response = client.post(
+        "/api/items",
+        json={"name": "A", "value": 2.0, "category": "books"},
+        headers=headers
+    )
+
+    assert response.status_code == 422
+
+
+def test_concurrent_requests_share_one_execution():
+    async def run():
+        cache = IdempotencyCache()
+        calls = 0
+        release = asyncio.Event()
+
+        async def operation():
+            nonlocal calls
+            calls += 1
+            await release.wait()
+            return {"id": calls}
+
+        requests = [asyncio.create_task(cache.execute("key", "fp", operation)) for _ in range(3)]
+        await asyncio.sleep(0)
+        release.set()
+        results = await asyncio.gather(*requests)
+
+        assert calls == 1
+        assert [result for result, _ in results] == [{"id": 1}] * 3
+        assert sorted(replayed for _, replayed in results) == [False, True, True]
+
+        with pytest.raises(IdempotencyMismatch):
+            await cache.execute("key", "other", operation)
+
+    asyncio.run(run())
+
+
+def test_sql_store_replays_across_workers_and_purges_expired(tmp_path):
+    url = f"sqlite:///{tmp_path / 'keys.db'}"
+    # Each worker creates the store at startup; the table already exists for the second
+    worker_a = SqlIdempotencyStore.from_url(url, ttl_seconds=60)
+    worker_b = SqlIdempotencyStore.from_url(url, ttl_seconds=60)
+
+    async def run():
+        assert await worker_a.claim("key", "fp") is None
+        await worker_a.complete("key", {"id": 1})
+        assert await worker_b.claim("key", "fp") == ("fp", {"id": 1})
+
+        assert await worker_a.claim("old", "fp") is None
+        await worker_a.complete("old", {"id": 0})
+        with worker_a.session_factory() as session:
+            session.get(IdempotencyRecord, "old").expires_at = datetime.utcnow() - timedelta(seconds=1)
+            session.commit()
+
+        assert await worker_b.purge_expired() == 1
+        with worker_a.session_factory() as session:
+            assert session.get(IdempotencyRecord, "old") is None
+            assert session.get(IdempotencyRecord, "key") is not None
+
+    asyncio.run(run())
+
+
+def test_pending_claim_is_only_taken_over_once_stale(tmp_path):
+    url = f"sqlite:///{tmp_path / 'keys.db'}"
+    worker_a = SqlIdempotencyStore.from_url(url, ttl_seconds=60, pending_timeout=600)
+    worker_b = SqlIdempotencyStore.from_url(url, ttl_seconds=60, pending_timeout=600)
+
+    async def run():
+        assert await worker_a.claim("key", "fp") is None
+        with pytest.raises(IdempotencyInProgress):
+            await worker_b.claim("key", "fp")
+
+        # Past the TTL but not the pending timeout: the owner may still record it
+        with worker_a.session_factory() as session:
+            record = session.get(IdempotencyRecord, "key")
+            record.created_at = datetime.utcnow() - timedelta(seconds=300)
+            record.expires_at = datetime.utcnow() - timedelta(seconds=1)
+            session.commit()
+        with pytest.raises(IdempotencyInProgress):
+            await worker_b.claim("key", "fp")
+        assert await worker_b.purge_expired() == 0
+
+        with worker_a.session_factory() as session:
+            session.get(IdempotencyRecord, "key").created_at = datetime.utcnow() - timedelta(seconds=601)
+            session.commit()
+        assert await worker_b.claim("key", "fp") is None
+
+    asyncio.run(run())
+
+
+def test_failed_complete_is_retried_instead_of_running_again(tmp_path, monkeypatch):
+    monkeypatch.setattr(idempotency, "RECORD_RETRY_MIN_SECONDS", 0.01)
+    url = f"sqlite:///{tmp_path / 'keys.db'}"
+    store_a = SqlIdempotencyStore.from_url(url, ttl_seconds=60)
+    complete = store_a.complete
+    failures = 2
+
+    async def flaky_complete(key, result):
+        nonlocal failures
+        if failures:
+            failures -= 1
+            raise OSError("database unavailable")
+        await complete(key, result)
+
+    monkeypatch.setattr(store_a, "complete", flaky_complete)
+    worker_a = IdempotencyCache(store=store_a)
+    worker_b = IdempotencyCache(store=SqlIdempotencyStore.from_url(url, ttl_seconds=60))
+    calls = 0
+
+    async def operation():
+        nonlocal calls
+        calls += 1
+        return {"id": calls}
+
+    async def run():
+        assert await worker_a.execute("key", "fp", operation) == ({"id": 1}, False)
+        with pytest.raises(IdempotencyInProgress):
+            await worker_b.execute("key", "fp", operation)
+
+        await asyncio.gather(*worker_a._recording)
+        assert await worker_b.execute("key", "fp", operation) == ({"id": 1}, True)
+        assert calls == 1
+
+    asyncio.run(run())
+
+
+def test_cancelled_operation_keeps_its_claim(tmp_path):
+    url = f"sqlite:///{tmp_path / 'keys.db'}"
+    worker_a = IdempotencyCache(store=SqlIdempotencyStore.from_url(url, ttl_seconds=60))
+    worker_b = IdempotencyCache(store=SqlIdempotencyStore.from_url(url, ttl_seconds=60))
+
+    async def run():
+        started = asyncio.Event()
+
+        async def operation():
+            started.set()
+            await asyncio.Event().wait()
+
+        request = asyncio.create_task(worker_a.execute("key", "fp", operation))
+        await started.wait()
+        request.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await request
+
+        # The write may have committed, so nobody else runs it until the claim is stale
+        with pytest.raises(IdempotencyInProgress):
+            await worker_b.execute("key", "fp", operation)
+
+    asyncio.run(run())
+
+
+def test_pending_timeout_is_configurable(monkeypatch):
+    monkeypatch.setenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "7200")
+
+    assert Settings().idempotency_pending_timeout_seconds == 7200
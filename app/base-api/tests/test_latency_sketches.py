@@ -0,0 +1,56 @@
+"""Tests for merging latency sketches across the workers of a pod."""
+import json
+import os
+import time
+
+from common.metrics import LatencySketches
+from common.sketch import DDSketch
+
+
+def test_export_merged_combines_published_workers(tmp_path):
+    other_worker = LatencySketches()
+    for _ in range(99):
+        other_worker.observe("GET", "/api/items", "cliente-b", 0.010)
+    other_worker.publish(str(tmp_path))
+    # Publish files are named by pid; make this one look like another process
+    own_file = tmp_path / f"sketches-{os.getpid()}.json"
+    own_file.rename(tmp_path / "sketches-1.json")
+
+    this_worker = LatencySketches()
+    this_worker.observe("GET", "/api/items", "cliente-b", 0.800)
+
+    workers, series = this_worker.export_merged("1m", str(tmp_path), max_age=15)
+
+    assert workers == 2
+    assert len(series) == 1
+    sketch = DDSketch.from_dict(series[0]["sketch"])
+    assert sketch.count == 100
+    assert abs(sketch.quantile(1.0) - 0.800) < 0.800 * 0.02
+
+
+def test_export_merged_skips_stale_workers(tmp_path):
+    exited_worker = LatencySketches()
+    exited_worker.observe("GET", "/api/items", "cliente-b", 0.010)
+    exited_worker.publish(str(tmp_path))
+    stale = tmp_path / "sketches-1.json"
+    (tmp_path / f"sketches-{os.getpid()}.json").rename(stale)
+    an_hour_ago = time.time() - 3600
+    os.utime(stale, (an_hour_ago, an_hour_ago))
+
+    workers, series = LatencySketches().export_merged("1m", str(tmp_path), max_age=15)
+
+    assert (workers, series) == (1, [])
+
+
+def test_publish_from_a_copy_is_unaffected_by_later_observations(tmp_path):
+    sketches = LatencySketches()
+    sketches.observe("GET", "/api/items", "cliente-b", 0.010)
+    series = sketches.copy_series()
+
+    # New series and a far-off value that grows the bin array
+    sketches.observe("POST", "/api/items", "cliente-b", 0.010)
+    sketches.observe("GET", "/api/items", "cliente-b", 50.0)
+    sketches.publish(str(tmp_path), series)
+
+    published = json.loads(next(tmp_path.glob("sketches-*.json")).read_text())["1m"]
+    assert [(entry["method"], entry["sketch"]["count"]) for entry in published] == [("GET", 1)]
@@ -0,0 +1,41 @@
+"""Tests for pod-wide /metrics under gunicorn's multiprocess mode."""
+import os
+import subprocess
+import sys
+
+from prometheus_client.parser import text_string_to_metric_families
+
+APP_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORKER = """
+from common.metrics import http_requests_total
+for _ in range({count}):
+    http_requests_total.labels(method="GET", endpoint="/api/items", status="200", client="cliente-b").inc()
+"""
+
+SCRAPE = """
+from common.metrics import get_metrics
+print(get_metrics()[0].decode())
+"""
+
+
+def run(code: str, directory) -> str:
+    env = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=str(directory))
+    return subprocess.run(
+        [sys.executable, "-c", code], cwd=APP_DIR, env=env, capture_output=True, text=True, check=True
+    ).stdout
+
+
+def test_metrics_count_requests_of_every_worker(tmp_path):
+    run(WORKER.format(count=3), tmp_path)
+    run(WORKER.format(count=4), tmp_path)
+
+    page = run(SCRAPE, tmp_path)
+
+    totals = [
+        sample.value
+        for family in text_string_to_metric_families(page)
+        for sample in family.samples
+        if sample.name == "http_requests_total"
+    ]
+    assert totals == [7.0]
@@ -0,0 +1,165 @@
+"""Tests for the item log: restore, torn writes, snapshot fallback, write failures."""
+import asyncio
+import time
+from datetime import datetime
+
+import pytest
+
+from persistence import ItemLog, LogFailed
+
+
+def make_item(item_id: int, name: str = None) -> dict:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    return {
+        "id": item_id,
+        "name": name or f"Item {item_id}",
+        "description": None,
+        "value": float(item_id),
+        "category": "books",
+        "status": "active",
+        "created_at": now,
+        "updated_at": now
+    }
+
+
+def write(directory, *records, snapshot_after: int = None):
+    """Append (op, item) records, optionally snapshotting after the first few."""
+    async def run():
+        log = ItemLog(directory, fsync=False)
+        store = {}
+        log.restore()
+        await log.start()
+        for position, (op, item) in enumerate(records, start=1):
+            store[item["id"]] = item
+            await log.append(op, item)
+            if position == snapshot_after:
+                await log.snapshot(store.values())
+        await log.close()
+
+    asyncio.run(run())
+
+
+def restore(directory):
+    return ItemLog(directory, fsync=False).restore()
+
+
+def test_restart_after_snapshot_replays_tail(tmp_path):
+    write(
+        tmp_path,
+        ("create", make_item(1)),
+        ("create", make_item(2)),
+        ("update", make_item(1, "Renamed")),
+        ("create", make_item(3)),
+        snapshot_after=2
+    )
+
+    assert len(list(tmp_path.glob("snapshot-*.snap"))) == 1
+    items, seq = restore(tmp_path)
+
+    assert seq == 4
+    assert sorted(items) == [1, 2, 3]
+    assert items[1]["name"] == "Renamed"
+    assert items[3]["created_at"] == datetime(2024, 1, 1, 12, 0, 0)
+
+
+def test_torn_last_record_is_truncated(tmp_path):
+    write(tmp_path, ("create", make_item(1)), ("create", make_item(2)))
+    segment = max(tmp_path.glob("log-*.log"))
+    intact = segment.stat().st_size
+    with open(segment, "ab") as f:
+        f.write(b'{"seq":3,"op":"create","item":{"id":3,"na')
+
+    items, seq = restore(tmp_path)
+
+    assert (sorted(items), seq) == ([1, 2], 2)
+    assert segment.stat().st_size == intact
+
+    # Records appended after the restart stay readable
+    write(tmp_path, ("create", make_item(3)))
+    items, seq = restore(tmp_path)
+    assert (sorted(items), seq) == ([1, 2, 3], 3)
+
+
+def test_unreadable_newest_snapshot_falls_back_to_older(tmp_path):
+    write(
+        tmp_path,
+        ("create", make_item(1)),
+        ("create", make_item(2)),
+        ("create", make_item(3)),
+        ("update", make_item(3, "Renamed")),
+        snapshot_after=2
+    )
+    older = next(tmp_path.glob("snapshot-*.snap"))
+
+    # A newer snapshot that was damaged on disk, e.g. cut short
+    newest = tmp_path / f"snapshot-{4:020d}.snap"
+    newest.write_bytes(older.read_bytes().replace(b'"seq":2', b'"seq":4')[:-10])
+
+    items, seq = restore(tmp_path)
+
+    # Older snapshot plus the log written after it
+    assert (sorted(items), seq) == ([1, 2, 3], 4)
+    assert items[3]["name"] == "Renamed"
+
+
+def test_failed_write_is_rolled_back_and_log_fails_closed(tmp_path, monkeypatch):
+    async def run():
+        log = ItemLog(tmp_path, fsync=False)
+        log.restore()
+        await log.start()
+        await log.append("create", make_item(1))
+
+        def fail(fd):
+            raise OSError(28, "No space left on device")
+
+        monkeypatch.setattr(log, "fsync", True)
+        monkeypatch.setattr("persistence.os.fsync", fail)
+        with pytest.raises(LogFailed):
+            await log.append("create", make_item(2))
+        monkeypatch.undo()
+
+        with pytest.raises(LogFailed):
+            log.append("create", make_item(3))
+        with pytest.raises(LogFailed):
+            await log.snapshot([make_item(1)])
+        await log.close()
+
+    asyncio.run(run())
+
+    items, seq = restore(tmp_path)
+    assert (sorted(items), seq) == ([1], 1)
+
+
+def test_snapshot_alongside_in_flight_appends_keeps_acknowledged_writes(tmp_path, monkeypatch):
+    async def run():
+        log = ItemLog(tmp_path, fsync=False)
+        store = {}
+        log.restore()
+        await log.start()
+
+        write = log._write
+
+        def slow_write(data):
+            time.sleep(0.05)
+            write(data)
+
+        monkeypatch.setattr(log, "_write", slow_write)
+
+        async def commit(item):
+            await log.append("create", item, apply=lambda: store.__setitem__(item["id"], item))
+
+        first = asyncio.create_task(commit(make_item(1)))
+        # The flusher is now writing item 1 when the snapshot starts
+        await asyncio.sleep(0.01)
+        snapshot = asyncio.create_task(log.snapshot(store.values()))
+        await asyncio.sleep(0)
+        second = asyncio.create_task(commit(make_item(2)))
+
+        await asyncio.gather(first, second, snapshot)
+        await log.close()
+        return sorted(store)
+
+    assert asyncio.run(run()) == [1, 2]
+
+    items, seq = restore(tmp_path)
+    assert (sorted(items), seq) == ([1, 2], 2)
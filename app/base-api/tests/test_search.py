@@ -0,0 +1,86 @@
+"""Tests for name search: ranking, index sync with the routes, compaction, filters."""
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import items
+from search import NameIndex
+
+
+@pytest.fixture
+def client():
+    app = FastAPI()
+    app.include_router(items.router)
+    return TestClient(app)
+
+
+def build(names, **kwargs) -> NameIndex:
+    index = NameIndex(**kwargs)
+    index.rebuild(enumerate(names, start=1))
+    return index
+
+
+def test_results_are_ranked_exact_then_prefix_then_substring():
+    index = build(["Sub Widget", "Widgets", "widget", "A widget", "Widget Pro", "gadget"])
+
+    assert index.search("widget") == [3, 2, 5, 4, 1]
+    assert index.search("WI") == [3, 2, 5]
+    assert index.search("widget", limit=2) == [3, 2]
+    assert index.search("nothing") == []
+
+
+def test_exact_match_is_found_beyond_the_candidate_budget():
+    index = build([f"abc-{n}" for n in range(1, 2001)] + ["abc"], max_candidates=100)
+
+    assert index.search("abc", limit=3) == [2001, 1, 2]
+
+
+def test_prefix_matches_outrank_substrings_beyond_the_candidate_budget():
+    names = [f"x{n}-foo" for n in range(1, 2001)] + ["foo bar"]
+    index = build(names, max_candidates=100)
+
+    assert index.search("foo", limit=2)[0] == 2001
+
+
+def test_filtered_out_candidates_do_not_use_up_the_budget():
+    index = build([f"x{n}-foo" for n in range(1, 2001)], max_candidates=100)
+
+    found = index.search("foo", limit=20, predicate=lambda item_id: item_id > 1900)
+
+    assert len(found) == 20
+    assert all(item_id > 1900 for item_id in found)
+
+
+def test_stale_postings_are_compacted():
+    index = build([f"old item {n}" for n in range(1, 501)])
+    for item_id in range(1, 501):
+        index.add(item_id, f"new thing {item_id}")
+    for item_id in range(1, 451):
+        index.remove(item_id)
+
+    # Stale ids never outnumber live ones (or the 1024 floor) for long
+    postings = sum(len(posting) for posting in index._postings.values())
+    assert postings <= index._live + max(index._live, 1024)
+    assert len(index) == 50
+    assert index.search("old item") == []
+    assert index.search("new thing 47") == list(range(470, 480))
+
+
+def test_rename_and_delete_keep_search_in_sync(client):
+    created = client.post("/api/items", json={"name": "Zephyr Lamp", "category": "home"}).json()
+
+    client.put(f"/api/items/{created['id']}", json={"name": "Quokka Lamp", "category": "home"})
+    assert client.get("/api/items/search", params={"q": "zephyr"}).json() == []
+    assert [item["id"] for item in client.get("/api/items/search", params={"q": "quokka"}).json()] == [created["id"]]
+
+    client.delete(f"/api/items/{created['id']}")
+    assert client.get("/api/items/search", params={"q": "quokka"}).json() == []
+
+
+def test_search_filters_by_category(client):
+    book = client.post("/api/items", json={"name": "Xylophone Guide", "category": "books"}).json()
+    client.post("/api/items", json={"name": "Xylophone", "category": "music"})
+
+    found = client.get("/api/items/search", params={"q": "xylophone", "category": "books"}).json()
+
+    assert [item["id"] for item in found] == [book["id"]]
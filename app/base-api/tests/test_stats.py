@@ -0,0 +1,71 @@
+"""Tests for incrementally maintained item statistics."""
+import random
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from routes import items
+from stats import ItemStats, _Extremes
+
+
+def test_extremes_track_min_and_max_through_removals():
+    extremes = _Extremes()
+    for value in (5.0, 1.0, 9.0, 1.0):
+        extremes.add(value)
+
+    extremes.remove(1.0)
+    assert (extremes.min(), extremes.max()) == (1.0, 9.0)
+
+    extremes.remove(1.0)
+    extremes.remove(9.0)
+    assert (extremes.min(), extremes.max()) == (5.0, 5.0)
+
+
+def test_extremes_memory_follows_live_values_not_updates():
+    extremes = _Extremes()
+    values = [float(i) for i in range(10)]
+    for value in values:
+        extremes.add(value)
+
+    rng = random.Random(1)
+    for _ in range(200_000):
+        i = rng.randrange(len(values))
+        extremes.remove(values[i])
+        values[i] = rng.uniform(0, 1000)
+        extremes.add(values[i])
+
+    assert len(extremes._low) <= 3 * len(values) + 32
+    assert len(extremes._high) <= 3 * len(values) + 32
+    assert extremes.min() == min(values)
+    assert extremes.max() == max(values)
+
+
+def test_update_moves_value_between_cells():
+    stats = ItemStats()
+    item = {"category": "books", "status": "active", "value": 10.0}
+    stats.add(item)
+    stats.add({"category": "books", "status": "active", "value": 30.0})
+
+    stats.update(item, dict(item, category="music", value=20.0))
+
+    groups = {g["group"]: g for g in stats.summarize("category")}
+    assert groups["books"]["count"] == 1
+    assert (groups["books"]["min"], groups["books"]["max"]) == (30.0, 30.0)
+    assert groups["music"]["sum"] == 20.0
+
+
+def test_stats_endpoint_matches_list_default_of_active_items():
+    app = FastAPI()
+    app.include_router(items.router)
+    client = TestClient(app)
+    category = "stats-transaction"
+    first = client.post("/api/items", json={"name": "T1", "value": 10.0, "category": category}).json()
+    client.post("/api/items", json={"name": "T2", "value": 5.0, "category": category})
+    client.delete(f"/api/items/{first['id']}")
+
+    listed = client.get("/api/items", params={"category": category}).json()
+    active = {g["group"]: g for g in client.get("/api/items/stats").json()["groups"]}[category]
+    every = {g["group"]: g for g in client.get("/api/items/stats", params={"status": ""}).json()["groups"]}[category]
+
+    assert (active["count"], active["sum"]) == (len(listed), sum(i["value"] for i in listed)) == (1, 5.0)
+    assert (every["count"], every["sum"]) == (2, 15.0)
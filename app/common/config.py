@@ -5,9 +5,57 @@ This module provides common settings used across all client APIs,
 including database connection, logging, and metrics configuration.
 """
 import os
+from pydantic import BaseModel, ConfigDict, Field, ValidationError, field_validator
 from pydantic_settings import BaseSettings
 
 
+class AdmissionLimits(BaseModel):
+    """Admission limits for one client, applied per worker process."""
+    model_config = ConfigDict(extra="forbid")
+    
+    read_rate: float = Field(ge=0)
+    read_burst: float = Field(ge=1)
+    write_rate: float = Field(ge=0)
+    write_burst: float = Field(ge=1)
+    max_concurrency: int = Field(ge=1)
+    max_queue: int = Field(ge=0)
+    queue_target_ms: float = Field(gt=0)
+
+
+# Built-in limits; ADMISSION_LIMITS overrides them key by key
+DEFAULT_ADMISSION_LIMITS = {
+    "default": {
+        "read_rate": 200.0,
+        "read_burst": 400,
+        "write_rate": 100.0,
+        "write_burst": 200,
+        "max_concurrency": 32,
+        "max_queue": 128,
+        "queue_target_ms": 250,
+    },
+    # Fintech: bursty, latency-critical - shed early rather than queue
+    "cliente-b": {
+        "read_rate": 500.0,
+        "read_burst": 1000,
+        "write_rate": 400.0,
+        "write_burst": 800,
+        "max_concurrency": 64,
+        "max_queue": 256,
+        "queue_target_ms": 100,
+    },
+    # SaaS: low volume, tolerant of queueing
+    "cliente-c": {
+        "read_rate": 100.0,
+        "read_burst": 200,
+        "write_rate": 50.0,
+        "write_burst": 100,
+        "max_concurrency": 16,
+        "max_queue": 64,
+        "queue_target_ms": 500,
+    },
+}
+
+
 class Settings(BaseSettings):
     """Common application settings."""
     
@@ -30,6 +78,73 @@ class Settings(BaseSettings):
     
     # Metrics configuration
     metrics_enabled: bool = os.getenv("METRICS_ENABLED", "true").lower() == "true"
+    # Workers of a pod publish latency sketches here to be merged per pod
+    sketch_dir: str = os.getenv("SKETCH_DIR", "/tmp/msp-sketches")
+    
+    # Admission control configuration
+    # Limits apply per worker process. Rates are requests/second refilled
+    # into a token bucket of size *_burst; queue_target_ms is the longest a
+    # request may wait for a concurrency slot before it is shed with a 503.
+    admission_enabled: bool = os.getenv("ADMISSION_ENABLED", "true").lower() == "true"
+    admission_limits: dict = DEFAULT_ADMISSION_LIMITS
+    
+    # Persistence configuration for the in-memory store
+    # Each worker process claims its own slot directory under persistence_dir.
+    persistence_enabled: bool = os.getenv("PERSISTENCE_ENABLED", "false").lower() == "true"
+    persistence_dir: str = os.getenv("PERSISTENCE_DIR", "/var/lib/msp-api")
+    log_commit_delay_ms: float = float(os.getenv("LOG_COMMIT_DELAY_MS", "0"))
+    log_fsync: bool = os.getenv("LOG_FSYNC", "true").lower() == "true"
+    snapshot_interval_seconds: int = int(os.getenv("SNAPSHOT_INTERVAL_SECONDS", "300"))
+    snapshot_min_records: int = int(os.getenv("SNAPSHOT_MIN_RECORDS", "10000"))
+    
+    # Change feed configuration
+    # History bounds how far back a reconnecting client can resume;
+    # queue size bounds how far a subscriber may lag before eviction.
+    change_feed_history: int = int(os.getenv("CHANGE_FEED_HISTORY", "10000"))
+    change_feed_queue_size: int = int(os.getenv("CHANGE_FEED_QUEUE_SIZE", "1000"))
+    
+    # Idempotency-Key configuration
+    # "memory" dedupes retries within a worker; "sql" also records keys in
+    # the database so retries routed to another worker are recognised.
+    idempotency_backend: str = os.getenv("IDEMPOTENCY_BACKEND", "memory")
+    idempotency_ttl_seconds: int = int(os.getenv("IDEMPOTENCY_TTL_SECONDS", "86400"))
+    idempotency_max_entries: int = int(os.getenv("IDEMPOTENCY_MAX_ENTRIES", "10000"))
+    # A key still unanswered after this long is assumed abandoned by a worker
+    # that died before writing, and may run again; keep it far above any
+    # request timeout
+    idempotency_pending_timeout_seconds: int = int(os.getenv("IDEMPOTENCY_PENDING_TIMEOUT_SECONDS", "3600"))
+    idempotency_purge_interval_seconds: int = int(os.getenv("IDEMPOTENCY_PURGE_INTERVAL_SECONDS", "600"))
+    
+    @field_validator("admission_limits", mode="before")
+    @classmethod
+    def merge_admission_limits(cls, value):
+        """
+        Overlay ADMISSION_LIMITS on the built-in limits key by key.
+        
+        '{"cliente-b": {"queue_target_ms": 50}}' only changes that one
+        value; every client entry must still resolve to complete limits.
+        """
+        if not isinstance(value, dict):
+            raise ValueError("admission_limits must map client ids to limits")
+        
+        merged = {client: dict(limits) for client, limits in DEFAULT_ADMISSION_LIMITS.items()}
+        for client, overrides in value.items():
+            if not isinstance(overrides, dict):
+                raise ValueError(f"admission_limits[{client!r}] must be an object")
+            merged.setdefault(client, {}).update(overrides)
+        
+        for client, limits in merged.items():
+            try:
+                AdmissionLimits(**{**merged["default"], **limits})
+            except ValidationError as e:
+                raise ValueError(f"invalid admission_limits[{client!r}]: {e}") from None
+        return merged
+    
+    def admission_limits_for(self, client_id: str) -> dict:
+        """Return admission limits for a client, falling back to defaults."""
+        limits = dict(self.admission_limits.get("default", {}))
+        limits.update(self.admission_limits.get(client_id, {}))
+        return AdmissionLimits(**limits).model_dump()
     
     class Config:
         env_file = ".env"
@@ -3,8 +3,21 @@ Prometheus metrics shared across all client applications.
 
 These metrics are scraped by Zabbix for monitoring and alerting.
 All client applications export the same metric types for consistency.
+
+Under gunicorn, PROMETHEUS_MULTIPROC_DIR is set so every worker records
+into files shared by the pod, and /metrics reports the whole pod
+whichever worker answers (see base-api/gunicorn.conf.py).
 """
-from prometheus_client import Counter, Histogram, Gauge, generate_latest, CONTENT_TYPE_LATEST
+import json
+import os
+import time
+
+from prometheus_client import (
+    Counter, Histogram, Gauge, CollectorRegistry, generate_latest, CONTENT_TYPE_LATEST, REGISTRY, multiprocess
+)
+from prometheus_client.core import GaugeMetricFamily
+
+from common.sketch import DDSketch, WindowedSketch
 
 
 # HTTP Request metrics
@@ -21,17 +34,219 @@ http_request_duration_seconds = Histogram(
     buckets=(0.005, 0.01, 0.025, 0.05, 0.075, 0.1, 0.25, 0.5, 0.75, 1.0, 2.5, 5.0, 7.5, 10.0)
 )
 
+
+class LatencySketches:
+    """
+    Sliding-window latency quantiles per route.
+    
+    Complements http_request_duration_seconds, whose fixed buckets are too
+    coarse for SLA percentiles (nothing between 100ms and 250ms). Each
+    series keeps a WindowedSketch, recorded in O(1) with bounded memory;
+    p50/p95/p99 over the last 1m and 5m are exported as gauges at scrape
+    time, and the raw sketches can be exported for merging across workers.
+    
+    Each worker periodically publishes its sketches to a directory shared
+    by the workers of a pod, so export_merged() can answer for the whole
+    pod whichever worker receives the request.
+    
+    observe() runs on the event loop and may add series or grow bin arrays
+    at any time, so work done in a thread must go through copy_series(),
+    called on the loop first.
+    """
+    
+    WINDOWS = {"1m": 60, "5m": 300}
+    QUANTILES = (0.5, 0.95, 0.99)
+    
+    def __init__(self, slot_seconds: float = 10):
+        self.slot_seconds = slot_seconds
+        self._series = {}
+    
+    def observe(self, method: str, endpoint: str, client: str, seconds: float):
+        key = (method, endpoint, client)
+        sketch = self._series.get(key)
+        if sketch is None:
+            sketch = self._series[key] = WindowedSketch(
+                window_seconds=max(self.WINDOWS.values()),
+                slot_seconds=self.slot_seconds
+            )
+        sketch.add(seconds)
+    
+    def copy_series(self) -> list:
+        """Copy of every series as (key, WindowedSketch) pairs; call on the event loop."""
+        return [(key, sketch.copy()) for key, sketch in list(self._series.items())]
+    
+    def export(self, window: str, series: list = None) -> list:
+        """
+        Merged sketch per series for one window, serialized for merging elsewhere.
+        
+        Args:
+            window: Window name from WINDOWS
+            series: Result of copy_series(); defaults to the live series,
+                which is only safe on the event loop
+        """
+        seconds = self.WINDOWS[window]
+        if series is None:
+            series = list(self._series.items())
+        return [
+            {
+                "method": method,
+                "endpoint": endpoint,
+                "client": client,
+                "window": window,
+                "sketch": sketch.merged(seconds).to_dict()
+            }
+            for (method, endpoint, client), sketch in series
+        ]
+    
+    def publish(self, directory: str, series: list = None):
+        """
+        Write this worker's sketches for every window where sibling workers can read them.
+        
+        Args:
+            directory: Directory shared by the workers of the pod
+            series: Result of copy_series(), required when run in a thread
+        """
+        if series is None:
+            series = self.copy_series()
+        os.makedirs(directory, exist_ok=True)
+        path = os.path.join(directory, f"sketches-{os.getpid()}.json")
+        temporary = f"{path}.tmp"
+        with open(temporary, "w") as f:
+            json.dump({window: self.export(window, series) for window in self.WINDOWS}, f)
+        os.replace(temporary, path)
+    
+    def export_merged(self, window: str, directory: str, max_age: float, series: list = None) -> tuple:
+        """
+        Sketches merged across this worker and every worker that published recently.
+        
+        Args:
+            window: Window name from WINDOWS
+            directory: Directory the workers publish to
+            max_age: Ignore files not refreshed for this many seconds (exited workers)
+            series: Result of copy_series(), required when run in a thread
+        
+        Returns:
+            tuple: (number of workers merged, series in the format of export())
+        """
+        merged = {}
+        
+        def add(series):
+            for entry in series:
+                key = (entry["method"], entry["endpoint"], entry["client"])
+                sketch = DDSketch.from_dict(entry["sketch"])
+                if key in merged:
+                    merged[key].merge(sketch)
+                else:
+                    merged[key] = sketch
+        
+        if series is None:
+            series = self.copy_series()
+        add(self.export(window, series))
+        workers = 1
+        own = f"sketches-{os.getpid()}.json"
+        now = time.time()
+        names = os.listdir(directory) if os.path.isdir(directory) else []
+        for name in names:
+            if name == own or not (name.startswith("sketches-") and name.endswith(".json")):
+                continue
+            path = os.path.join(directory, name)
+            try:
+                if now - os.path.getmtime(path) > max_age:
+                    continue
+                with open(path) as f:
+                    published = json.load(f)
+            except (OSError, ValueError):
+                continue
+            add(published.get(window, []))
+            workers += 1
+        
+        return workers, [
+            {
+                "method": method,
+                "endpoint": endpoint,
+                "client": client,
+                "window": window,
+                "sketch": sketch.to_dict()
+            }
+            for (method, endpoint, client), sketch in merged.items()
+        ]
+    
+    def collect(self):
+        gauge = GaugeMetricFamily(
+            'http_request_duration_window_seconds',
+            'HTTP request duration quantiles over a sliding window',
+            labels=['method', 'endpoint', 'client', 'window', 'quantile']
+        )
+        for (method, endpoint, client), sketch in list(self._series.items()):
+            for window, seconds in self.WINDOWS.items():
+                merged = sketch.merged(seconds)
+                if not merged.count:
+                    continue
+                for q in self.QUANTILES:
+                    gauge.add_metric(
+                        [method, endpoint, client, window, str(q)],
+                        merged.quantile(q)
+                    )
+        yield gauge
+
+
+http_request_latency_sketches = LatencySketches()
+REGISTRY.register(http_request_latency_sketches)
+
+# Admission control metrics
+admission_requests_queued_total = Counter(
+    'admission_requests_queued_total',
+    'Requests that waited for a concurrency slot',
+    ['route_class', 'client']
+)
+
+admission_requests_shed_total = Counter(
+    'admission_requests_shed_total',
+    'Requests rejected by admission control',
+    ['route_class', 'reason', 'client']
+)
+
+admission_queue_depth = Gauge(
+    'admission_queue_depth',
+    'Requests currently waiting for a concurrency slot',
+    ['client'],
+    multiprocess_mode='livesum'
+)
+
+admission_in_flight = Gauge(
+    'admission_in_flight_requests',
+    'Requests currently holding a concurrency slot',
+    ['client'],
+    multiprocess_mode='livesum'
+)
+
+# Change feed metrics
+change_feed_subscribers = Gauge(
+    'change_feed_subscribers',
+    'Clients currently streaming item changes',
+    ['client'],
+    multiprocess_mode='livesum'
+)
+
+change_feed_evictions_total = Counter(
+    'change_feed_evictions_total',
+    'Change feed subscribers evicted for falling behind',
+    ['client']
+)
+
 # Application metrics
 active_connections = Gauge(
     'active_database_connections',
     'Number of active database connections',
-    ['client']
+    ['client'],
+    multiprocess_mode='livesum'
 )
 
 application_info = Gauge(
     'application_info',
     'Application information',
-    ['client', 'version']
+    ['client', 'version'],
+    multiprocess_mode='max'
 )
 
 
@@ -39,7 +254,17 @@ def get_metrics():
     """
     Generate Prometheus metrics in text format.
     
+    With PROMETHEUS_MULTIPROC_DIR set, counters, histograms and gauges
+    cover every worker of the pod; the sliding-window quantile gauges
+    are still this worker's (/metrics/sketches has the pod-wide ones).
+    
     Returns:
         tuple: (metrics_content, content_type)
     """
-    return generate_latest(), CONTENT_TYPE_LATEST
+    if "PROMETHEUS_MULTIPROC_DIR" not in os.environ:
+        return generate_latest(), CONTENT_TYPE_LATEST
+    
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    registry.register(http_request_latency_sketches)
+    return generate_latest(registry), CONTENT_TYPE_LATEST
@@ -0,0 +1,226 @@
+"""
+Mergeable quantile sketch shared across client applications.
+
+DDSketch-style sketch: values are counted in logarithmic bins, so any
+quantile is returned within a fixed relative error, and sketches built in
+different workers can be merged by adding bin counts.
+
+Bins live in a dense integer array, so adding or removing a value is O(1)
+and memory is bounded by max_bins. When the range of values needs more
+bins than that, the lowest bins are collapsed together; this only costs
+accuracy for the smallest values, never for the tail.
+
+WindowedSketch keeps a ring of per-slot sketches to answer quantiles
+over a sliding time window.
+
+Only non-negative values are supported.
+"""
+import math
+import time
+from array import array
+from typing import Optional
+
+# Values at or below this are counted as zero
+MIN_INDEXABLE_VALUE = 1e-9
+
+
+class DDSketch:
+    """Quantile sketch with bounded relative error."""
+
+    def __init__(self, relative_accuracy: float = 0.01, max_bins: int = 2048):
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self.gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._multiplier = 1 / math.log(self.gamma)
+
+        self.bins = array("q")
+        self.offset = 0
+        self.zero_count = 0
+        self.count = 0
+
+    def _key(self, value: float) -> int:
+        return math.ceil(math.log(value) * self._multiplier)
+
+    def _value(self, key: int) -> float:
+        # Midpoint of the bin (gamma^(key-1), gamma^key] in relative terms
+        return 2 * self.gamma ** key / (self.gamma + 1)
+
+    def add(self, value: float, count: int = 1):
+        """Record `count` occurrences of value."""
+        self.count += count
+        if value <= MIN_INDEXABLE_VALUE:
+            self.zero_count += count
+            return
+        index = self._index(self._key(value))
+        self.bins[index] += count
+
+    def remove(self, value: float, count: int = 1):
+        """Forget `count` occurrences of a value previously added."""
+        self.count -= count
+        if value <= MIN_INDEXABLE_VALUE:
+            self.zero_count -= count
+            return
+        index = self._index(self._key(value))
+        self.bins[index] -= count
+
+    def merge(self, other: "DDSketch"):
+        """Add all values recorded in another sketch with the same accuracy."""
+        if other.gamma != self.gamma:
+            raise ValueError("Cannot merge sketches with different relative accuracy")
+
+        self.count += other.count
+        self.zero_count += other.zero_count
+        self._add_bins(other.offset, other.bins)
+
+    def copy(self) -> "DDSketch":
+        """Independent copy; the bin array is copied in one step."""
+        sketch = DDSketch.__new__(DDSketch)
+        sketch.__dict__.update(self.__dict__)
+        sketch.bins = array("q", self.bins)
+        return sketch
+
+    def clear(self):
+        self.bins = array("q")
+        self.offset = 0
+        self.zero_count = 0
+        self.count = 0
+
+    def quantile(self, q: float) -> Optional[float]:
+        """
+        Estimate the q-quantile (0 <= q <= 1).
+
+        Returns:
+            float: Estimated value, or None if the sketch is empty
+        """
+        if self.count <= 0:
+            return None
+
+        rank = q * (self.count - 1)
+        seen = self.zero_count
+        if seen > rank:
+            return 0.0
+
+        for position, bin_count in enumerate(self.bins):
+            seen += bin_count
+            if seen > rank:
+                return self._value(self.offset + position)
+
+        return self._value(self.offset + len(self.bins) - 1)
+
+    def to_dict(self) -> dict:
+        """Serialize for merging in another process."""
+        return {
+            "relative_accuracy": self.relative_accuracy,
+            "offset": self.offset,
+            "bins": self.bins.tolist(),
+            "zero_count": self.zero_count,
+            "count": self.count
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, max_bins: int = 2048) -> "DDSketch":
+        sketch = cls(data["relative_accuracy"], max_bins=max_bins)
+        sketch.count = data["count"]
+        sketch.zero_count = data["zero_count"]
+        sketch._add_bins(data["offset"], data["bins"])
+        return sketch
+
+    def _add_bins(self, offset: int, bins):
+        for position, bin_count in enumerate(bins):
+            if bin_count:
+                index = self._index(offset + position)
+                self.bins[index] += bin_count
+
+    def _index(self, key: int) -> int:
+        """
+        Position of key in self.bins, growing or collapsing the array as needed.
+
+        May replace self.bins, so callers must index self.bins only after calling.
+        """
+        bins = self.bins
+        if not bins:
+            self.offset = key
+            bins.append(0)
+            return 0
+
+        low = self.offset
+        high = low + len(bins) - 1
+        if low <= key <= high:
+            return key - low
+
+        new_low = min(low, key)
+        new_high = max(high, key)
+        if new_high - new_low + 1 > self.max_bins:
+            new_low = new_high - self.max_bins + 1
+
+        if key > high:
+            bins.extend(array("q", bytes(8 * (new_high - high))))
+        if new_low < low:
+            self.bins = array("q", bytes(8 * (low - new_low))) + bins
+        elif new_low > low:
+            # Collapse everything below new_low into the lowest kept bin
+            cut = new_low - low
+            collapsed = sum(bins[:cut + 1])
+            self.bins = bins[cut:]
+            self.bins[0] = collapsed
+        self.offset = new_low
+
+        return max(key, new_low) - new_low
+
+
+class WindowedSketch:
+    """
+    Quantiles over a sliding time window.
+
+    Time is cut into slots of `slot_seconds`; each slot has its own sketch
+    in a fixed ring covering `window_seconds`. Recording touches only the
+    current slot, and a slot is reset when the ring wraps around to it,
+    so memory is bounded by the number of slots times max_bins.
+    """
+
+    def __init__(
+        self,
+        window_seconds: float = 300,
+        slot_seconds: float = 10,
+        relative_accuracy: float = 0.01,
+        max_bins: int = 1024
+    ):
+        self.slot_seconds = slot_seconds
+        self.slots = max(1, math.ceil(window_seconds / slot_seconds))
+        self.relative_accuracy = relative_accuracy
+        self.max_bins = max_bins
+        self._sketches = [DDSketch(relative_accuracy, max_bins) for _ in range(self.slots)]
+        self._epochs = [-1] * self.slots
+
+    def copy(self) -> "WindowedSketch":
+        """Independent copy of every slot, cheap enough to take on the event loop."""
+        windowed = WindowedSketch.__new__(WindowedSketch)
+        windowed.__dict__.update(self.__dict__)
+        windowed._sketches = [sketch.copy() for sketch in self._sketches]
+        windowed._epochs = list(self._epochs)
+        return windowed
+
+    def add(self, value: float, now: Optional[float] = None):
+        """Record a value at time `now` (defaults to the current time)."""
+        epoch = int((time.time() if now is None else now) // self.slot_seconds)
+        position = epoch % self.slots
+        if self._epochs[position] != epoch:
+            self._sketches[position].clear()
+            self._epochs[position] = epoch
+        self._sketches[position].add(value)
+
+    def merged(self, window_seconds: float, now: Optional[float] = None) -> DDSketch:
+        """
+        Merge the slots covering the last `window_seconds` into one sketch.
+
+        The window is rounded up to whole slots and includes the current,
+        partially filled slot.
+        """
+        current = int((time.time() if now is None else now) // self.slot_seconds)
+        oldest = current - min(self.slots, math.ceil(window_seconds / self.slot_seconds)) + 1
+
+        result = DDSketch(self.relative_accuracy, self.max_bins)
+        for epoch, sketch in zip(self._epochs, self._sketches):
+            if oldest <= epoch <= current:
+                result.merge(sketch)
+        return result
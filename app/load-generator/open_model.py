@@ -0,0 +1,187 @@
+"""
+Open-model load testing for MSP clients
+Requests arrive at a constant rate per client whatever the response time,
+so a slow API builds up in-flight requests instead of lowering the load
+
+Run with run_open_model.py to use every CPU of the machine
+"""
+from locust import FastHttpUser, task, constant, events
+from locust.exception import StopUser
+from locust.runners import MasterRunner, WorkerRunner
+from gevent.pool import Pool
+import gevent
+import logging
+import os
+import random
+import time
+
+# Imported as a module so Locust does not also run the closed-model users
+import locustfile as closed_model
+
+logger = logging.getLogger(__name__)
+
+# Target requests per second per client, across all worker processes
+ARRIVAL_RATES = {
+    'cliente-a': float(os.getenv('CLIENTE_A_RATE', '50')),
+    'cliente-b': float(os.getenv('CLIENTE_B_RATE', '500')),
+    'cliente-c': float(os.getenv('CLIENTE_C_RATE', '20')),
+}
+
+# Schedulers per client; run_open_model.py sets one per worker process
+SCHEDULERS = int(os.getenv('OPEN_MODEL_SCHEDULERS', '1'))
+
+# Requests a scheduler may have outstanding; arrivals beyond this are
+# reported as failures rather than delayed, which would hide the backlog
+MAX_IN_FLIGHT = int(os.getenv('MAX_IN_FLIGHT', '500'))
+
+# Generator health thresholds
+SCHEDULE_LAG_WARNING_MS = float(os.getenv('SCHEDULE_LAG_WARNING_MS', '20'))
+CPU_WARNING_PERCENT = float(os.getenv('GENERATOR_CPU_WARNING_PERCENT', '80'))
+MONITOR_INTERVAL = 5
+
+
+class InFlightLimitReached(Exception):
+    """Arrival dropped because the API has not answered earlier requests"""
+
+
+class GeneratorMonitor:
+    """
+    Tracks how late arrivals are sent compared to their schedule
+
+    Lag grows when the generator process cannot keep up (CPU bound),
+    not when the API is slow, since requests are sent without waiting.
+    """
+
+    def __init__(self):
+        self.lags = []
+
+    def record(self, lag: float):
+        self.lags.append(lag)
+
+    def drain(self):
+        """Return (arrivals, p99 lag in ms) since the last call"""
+        lags, self.lags = self.lags, []
+        if not lags:
+            return 0, 0.0
+        lags.sort()
+        return len(lags), lags[int(len(lags) * 0.99)] * 1000
+
+
+monitor = GeneratorMonitor()
+
+
+class OpenModelUser(FastHttpUser):
+    """
+    Arrival scheduler for one client scenario
+
+    Each instance sends its share of arrival_rate at evenly spaced times,
+    picking the request from the closed-model user's weighted tasks.
+    Requests run in their own greenlets over pooled keep-alive connections.
+    """
+    abstract = True
+    wait_time = constant(0)
+    fixed_count = SCHEDULERS
+    concurrency = MAX_IN_FLIGHT
+    arrival_rate = 0.0
+    scenario = []
+
+    @task
+    def arrivals(self):
+        """Send requests on schedule until the test stops"""
+        if self.arrival_rate <= 0:
+            raise StopUser()
+
+        in_flight = Pool(MAX_IN_FLIGHT)
+        interval = self.fixed_count / self.arrival_rate
+        # Stagger schedulers so their arrivals interleave
+        next_at = time.monotonic() + random.uniform(0, interval)
+
+        try:
+            while True:
+                delay = next_at - time.monotonic()
+                if delay > 0:
+                    gevent.sleep(delay)
+                monitor.record(max(0.0, time.monotonic() - next_at))
+                next_at += interval
+
+                if in_flight.full():
+                    self.environment.events.request.fire(
+                        request_type="ARRIVAL",
+                        name=f"{self.__class__.__name__} dropped",
+                        response_time=0,
+                        response_length=0,
+                        exception=InFlightLimitReached(f"{MAX_IN_FLIGHT} requests in flight"),
+                        context={}
+                    )
+                    continue
+
+                in_flight.spawn(self._send, random.choice(self.scenario))
+        finally:
+            in_flight.kill(block=False)
+
+    def _send(self, request):
+        try:
+            request(self)
+        except Exception as e:
+            logger.error(f"Request failed in {self.__class__.__name__}: {e!r}")
+            self.environment.events.user_error.fire(user_instance=self, exception=e, tb=e.__traceback__)
+
+
+class ClienteAOpenUser(OpenModelUser):
+    """E-commerce arrivals: browsing and orders"""
+    host = closed_model.ClienteAUser.host
+    arrival_rate = ARRIVAL_RATES['cliente-a']
+    scenario = closed_model.ClienteAUser.tasks
+
+
+class ClienteBOpenUser(OpenModelUser):
+    """Fintech arrivals: transaction heavy"""
+    host = closed_model.ClienteBUser.host
+    arrival_rate = ARRIVAL_RATES['cliente-b']
+    scenario = closed_model.ClienteBUser.tasks
+
+
+class ClienteCOpenUser(OpenModelUser):
+    """SaaS arrivals: CRM operations"""
+    host = closed_model.ClienteCUser.host
+    arrival_rate = ARRIVAL_RATES['cliente-c']
+    scenario = closed_model.ClienteCUser.tasks
+
+
+def check_generator(environment):
+    """Warn when this process, not the API, limits the offered load"""
+    while True:
+        gevent.sleep(MONITOR_INTERVAL)
+        arrivals, lag_ms = monitor.drain()
+        cpu = environment.runner.current_cpu_usage
+
+        if lag_ms < SCHEDULE_LAG_WARNING_MS and cpu < CPU_WARNING_PERCENT:
+            continue
+
+        logger.warning(
+            f"Load generator is the bottleneck: p99 schedule lag {lag_ms:.0f}ms, "
+            f"CPU {cpu:.0f}% over {arrivals} arrivals. Add worker processes or "
+            f"lower the arrival rates, results understate what the API can take"
+        )
+        if isinstance(environment.runner, WorkerRunner):
+            environment.runner.send_message("generator_bottleneck", {
+                "lag_ms": lag_ms,
+                "cpu": cpu,
+                "arrivals": arrivals
+            })
+
+
+def on_generator_bottleneck(environment, msg, **kwargs):
+    """Surface worker warnings in the master log"""
+    logger.warning(
+        f"Worker {msg.node_id} is the bottleneck: p99 schedule lag "
+        f"{msg.data['lag_ms']:.0f}ms, CPU {msg.data['cpu']:.0f}%"
+    )
+
+
+@events.init.add_listener
+def on_init(environment, **kwargs):
+    if isinstance(environment.runner, MasterRunner):
+        environment.runner.register_message("generator_bottleneck", on_generator_bottleneck)
+    elif environment.runner is not None:
+        gevent.spawn(check_generator, environment)
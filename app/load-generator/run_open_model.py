@@ -0,0 +1,59 @@
+"""
+Run the open-model load test across all CPUs of one machine
+Starts a Locust master and one worker process per CPU; arguments after
+the options are passed to the master (e.g. --headless --run-time 10m)
+
+Usage:
+    python run_open_model.py --processes 4 --headless --run-time 10m
+    CLIENTE_B_RATE=2000 python run_open_model.py ClienteBOpenUser
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+LOCUSTFILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "open_model.py")
+SCENARIOS = 3
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Open-model load test on one machine")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=os.cpu_count(),
+        help="Worker processes (default: one per CPU)"
+    )
+    args, locust_args = parser.parse_known_args()
+
+    # One scheduler per client per worker spreads each arrival rate evenly
+    env = dict(os.environ, OPEN_MODEL_SCHEDULERS=str(args.processes))
+    users = args.processes * SCENARIOS
+
+    master = subprocess.Popen([
+        "locust", "-f", LOCUSTFILE, "--master",
+        "--expect-workers", str(args.processes),
+        "--users", str(users), "--spawn-rate", str(users),
+        *locust_args
+    ], env=env)
+    workers = [
+        subprocess.Popen(["locust", "-f", LOCUSTFILE, "--worker"], env=env)
+        for _ in range(args.processes)
+    ]
+
+    try:
+        returncode = master.wait()
+    except KeyboardInterrupt:
+        master.terminate()
+        returncode = master.wait()
+    finally:
+        for worker in workers:
+            worker.terminate()
+        for worker in workers:
+            worker.wait()
+
+    sys.exit(returncode)
+
+
+if __name__ == "__main__":
+    main()
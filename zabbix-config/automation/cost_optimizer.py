@@ -1,10 +1,19 @@
 """
 Cost Optimizer - Scheduled scaling for off-hours
 Runs as CronJob in Kubernetes to scale down non-critical workloads
+
+Also recommends resource requests and HPA bounds from usage history:
+    python cost_optimizer.py recommend history.csv --report report.json --patch-dir patches/
 """
+import argparse
+import csv
+import json
+import math
 import subprocess
 import logging
 from datetime import datetime
+from typing import Dict, Optional
+import numpy as np
 import requests
 import os
 
@@ -24,6 +33,51 @@ COST_OPTIMIZATION_CONFIG = {
     }
 }
 
+# Right-sizing policy per client
+# current: values deployed in k8s/<client>/app-deployment.yaml and app-hpa.yaml
+# Stricter SLAs size requests from a higher usage percentile, with more
+# headroom, and keep more replicas around as a floor.
+RIGHT_SIZING_CONFIG = {
+    'cliente-a': {
+        'cpu_percentile': 95,
+        'memory_percentile': 99,
+        'headroom': 1.2,
+        'target_utilization': 0.75,  # HPA averageUtilization
+        'min_replicas_percentile': 50,
+        'min_replicas_floor': 2,
+        'current': {'cpu_m': 200, 'memory_mi': 256, 'min_replicas': 2, 'max_replicas': 8}
+    },
+    'cliente-b': {
+        'cpu_percentile': 99,
+        'memory_percentile': 99.9,
+        'headroom': 1.3,
+        'target_utilization': 0.60,
+        'min_replicas_percentile': 90,
+        'min_replicas_floor': 3,
+        'current': {'cpu_m': 200, 'memory_mi': 256, 'min_replicas': 5, 'max_replicas': 20}
+    },
+    'cliente-c': {
+        'cpu_percentile': 90,
+        'memory_percentile': 99,
+        'headroom': 1.1,
+        'target_utilization': 0.80,
+        'min_replicas_percentile': 10,
+        'min_replicas_floor': 1,
+        'current': {'cpu_m': 200, 'memory_mi': 256, 'min_replicas': 1, 'max_replicas': 4}
+    }
+}
+
+# Peak load is multiplied by this when suggesting maxReplicas
+MAX_REPLICAS_HEADROOM = float(os.getenv('MAX_REPLICAS_HEADROOM', '1.5'))
+# Memory limit relative to the highest observed usage; memory is not
+# compressible, so a tight limit turns a spike into an OOM kill
+MEMORY_LIMIT_HEADROOM = 2.0
+# Samples are grouped into buckets of this many seconds to get per-client totals
+HISTORY_BUCKET_SECONDS = int(os.getenv('HISTORY_BUCKET_SECONDS', '60'))
+# Allocatable resources of a worker node, used to report pods per node
+NODE_CPU_M = int(os.getenv('NODE_ALLOCATABLE_CPU_M', '1930'))
+NODE_MEMORY_MI = int(os.getenv('NODE_ALLOCATABLE_MEMORY_MI', '3300'))
+
 WEBHOOK_URL = os.getenv(
     'WEBHOOK_URL',
     'http://webhook-handler.monitoring.svc.cluster.local:8080'
@@ -83,6 +137,202 @@ def optimize_client(client: str, config: dict):
         logger.error(f"Request failed for {client}: {e}")
 
 
+def load_history(path: str) -> Dict[str, Dict[str, np.ndarray]]:
+    """
+    Load per-pod usage samples from CSV
+    
+    Columns: timestamp (unix seconds), client, pod, cpu_m (millicores),
+    memory_mi, requests_per_second. One row per pod per sample.
+    
+    Returns:
+        dict: Client -> column name -> array, with pods as integer codes
+    """
+    columns = {}
+    pods = {}
+    with open(path, newline='') as f:
+        for row in csv.DictReader(f):
+            columns.setdefault(row['client'], []).append((
+                float(row['timestamp']),
+                float(row['cpu_m']),
+                float(row['memory_mi']),
+                float(row['requests_per_second'] or 0)
+            ))
+            pods.setdefault(row['client'], []).append(row['pod'])
+    
+    history = {}
+    for client, rows in columns.items():
+        data = np.asarray(rows, dtype=np.float64)
+        _, pod_index = np.unique(pods[client], return_inverse=True)
+        history[client] = {
+            'timestamp': data[:, 0],
+            'pod': pod_index,
+            'cpu_m': data[:, 1],
+            'memory_mi': data[:, 2],
+            'rps': data[:, 3]
+        }
+    return history
+
+
+def pods_per_node(cpu_m: float, memory_mi: float) -> int:
+    """How many pods with these requests fit on one node"""
+    return int(min(NODE_CPU_M // cpu_m, NODE_MEMORY_MI // memory_mi))
+
+
+def recommend(client: str, samples: Dict[str, np.ndarray], config: dict) -> dict:
+    """
+    Recommend resource requests and HPA bounds for one client
+    
+    Requests cover the configured usage percentile of a single pod, taken
+    over its average in each history bucket. The replica count the HPA
+    would have needed with those requests is replayed over the history
+    to suggest minReplicas and maxReplicas.
+    
+    Args:
+        client: Client identifier
+        samples: Arrays from load_history()
+        config: Right-sizing policy
+    
+    Returns:
+        dict: Recommendation report
+    """
+    headroom = config['headroom']
+    target = config['target_utilization']
+    current = config['current']
+    
+    # Average each pod over each time bucket first, so a pod sampled
+    # several times in a bucket still counts once whatever the cadence
+    pod_count = int(samples['pod'].max()) + 1
+    buckets = (samples['timestamp'] // HISTORY_BUCKET_SECONDS).astype(np.int64)
+    pod_buckets, index = np.unique(buckets * pod_count + samples['pod'], return_inverse=True)
+    counts = np.bincount(index)
+    cpu = np.bincount(index, weights=samples['cpu_m']) / counts
+    memory = np.bincount(index, weights=samples['memory_mi']) / counts
+    rps = np.bincount(index, weights=samples['rps']) / counts
+    
+    cpu_request = max(10, 10 * math.ceil(np.percentile(cpu, config['cpu_percentile']) * headroom / 10))
+    memory_request = max(64, 16 * math.ceil(np.percentile(memory, config['memory_percentile']) * headroom / 16))
+    memory_limit = max(memory_request, 16 * math.ceil(samples['memory_mi'].max() * MEMORY_LIMIT_HEADROOM / 16))
+    
+    # Totals per time bucket across all pods of the client
+    _, bucket_index = np.unique(pod_buckets // pod_count, return_inverse=True)
+    total_cpu = np.bincount(bucket_index, weights=cpu)
+    total_rps = np.bincount(bucket_index, weights=rps)
+    observed_replicas = np.bincount(bucket_index)
+    
+    # Replicas the HPA needs to keep average utilization at its target
+    needed = np.ceil(total_cpu / (target * cpu_request))
+    min_replicas = max(
+        config['min_replicas_floor'],
+        int(np.ceil(np.percentile(needed, config['min_replicas_percentile'])))
+    )
+    max_replicas = max(min_replicas, int(np.ceil(needed.max() * MAX_REPLICAS_HEADROOM)))
+    
+    # Millicores per request/s, least squares through the origin
+    rps_per_replica = None
+    if np.any(total_rps > 0):
+        cpu_per_rps = np.dot(total_cpu, total_rps) / np.dot(total_rps, total_rps)
+        if cpu_per_rps > 0:
+            rps_per_replica = round(float(target * cpu_request / cpu_per_rps), 1)
+    
+    return {
+        'client': client,
+        'samples': int(samples['cpu_m'].size),
+        'history_hours': round(float(np.ptp(samples['timestamp'])) / 3600, 1),
+        'usage': {
+            'cpu_m': {p: round(float(v), 1) for p, v in zip(('p50', 'p95', 'p99', 'max'), np.percentile(cpu, [50, 95, 99, 100]))},
+            'memory_mi': {p: round(float(v), 1) for p, v in zip(('p50', 'p95', 'p99', 'max'), np.percentile(memory, [50, 95, 99, 100]))},
+            'peak_rps': round(float(total_rps.max()), 1),
+            'replicas': {'min': int(observed_replicas.min()), 'max': int(observed_replicas.max())}
+        },
+        'current': dict(current, pods_per_node=pods_per_node(current['cpu_m'], current['memory_mi'])),
+        'recommended': {
+            'cpu_m': cpu_request,
+            'memory_mi': memory_request,
+            'memory_limit_mi': memory_limit,
+            'min_replicas': min_replicas,
+            'max_replicas': max_replicas,
+            'rps_per_replica': rps_per_replica,
+            'pods_per_node': pods_per_node(cpu_request, memory_request)
+        }
+    }
+
+
+def patch_payloads(recommendation: dict) -> dict:
+    """
+    Build kubectl patches applying a recommendation
+    
+    Returns:
+        dict: Resource name -> strategic merge patch
+    """
+    client = recommendation['client']
+    rec = recommendation['recommended']
+    return {
+        f"deployment/{client}-api": {
+            "spec": {"template": {"spec": {"containers": [{
+                "name": "api",
+                "resources": {
+                    "requests": {"cpu": f"{rec['cpu_m']}m", "memory": f"{rec['memory_mi']}Mi"},
+                    "limits": {"memory": f"{rec['memory_limit_mi']}Mi"}
+                }
+            }]}}}
+        },
+        f"hpa/{client}-hpa": {
+            "spec": {"minReplicas": rec['min_replicas'], "maxReplicas": rec['max_replicas']}
+        }
+    }
+
+
+def run_recommendations(history_path: str, report_path: Optional[str] = None, patch_dir: Optional[str] = None):
+    """
+    Recommend right-sizing for every client in the history file
+    
+    Args:
+        history_path: CSV of per-pod usage samples
+        report_path: Write the JSON report here if set
+        patch_dir: Write one patch file per resource here if set
+    """
+    history = load_history(history_path)
+    report = []
+    
+    for client, config in RIGHT_SIZING_CONFIG.items():
+        if client not in history:
+            logger.warning(f"{client}: No usage history")
+            continue
+        
+        recommendation = recommend(client, history[client], config)
+        recommendation['patches'] = patch_payloads(recommendation)
+        report.append(recommendation)
+        
+        current = recommendation['current']
+        rec = recommendation['recommended']
+        logger.info(
+            f"{client}: requests {current['cpu_m']}m/{current['memory_mi']}Mi -> "
+            f"{rec['cpu_m']}m/{rec['memory_mi']}Mi, "
+            f"replicas {current['min_replicas']}-{current['max_replicas']} -> "
+            f"{rec['min_replicas']}-{rec['max_replicas']}, "
+            f"pods/node {current['pods_per_node']} -> {rec['pods_per_node']} "
+            f"({recommendation['history_hours']}h of history)"
+        )
+        if recommendation['history_hours'] < 24 * 7:
+            logger.warning(f"{client}: Less than a week of history, weekly peaks may be missed")
+        
+        if patch_dir:
+            os.makedirs(patch_dir, exist_ok=True)
+            for resource, patch in recommendation['patches'].items():
+                kind = resource.split('/')[0]
+                path = os.path.join(patch_dir, f"{client}-{kind}.json")
+                with open(path, 'w') as f:
+                    json.dump(patch, f, indent=2)
+                logger.info(f"Apply with: kubectl patch {resource} -n {client} --patch-file {path}")
+    
+    if report_path:
+        with open(report_path, 'w') as f:
+            json.dump(report, f, indent=2)
+        logger.info(f"Report written to {report_path}")
+    
+    return report
+
+
 def main():
     """Main cost optimization routine"""
     logger.info("=" * 50)
@@ -100,4 +350,15 @@ def main():
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description="MSP cost optimizer")
+    subparsers = parser.add_subparsers(dest="command")
+    recommend_parser = subparsers.add_parser("recommend", help="Right-size requests and HPA bounds from usage history")
+    recommend_parser.add_argument("history", help="CSV of per-pod usage samples")
+    recommend_parser.add_argument("--report", help="Write the JSON report to this file")
+    recommend_parser.add_argument("--patch-dir", help="Write kubectl patch files to this directory")
+    args = parser.parse_args()
+    
+    if args.command == "recommend":
+        run_recommendations(args.history, args.report, args.patch_dir)
+    else:
+        main()
@@ -0,0 +1,393 @@
+"""
+Metrics Collector - Prometheus /metrics to Zabbix
+Scrapes every API replica per client, aggregates across replicas and
+pushes the values Zabbix templates expect using the sender protocol
+
+Latency percentiles are computed fleet-wide by merging the DDSketches
+each replica serves at /metrics/sketches, since percentiles of separate
+replicas cannot be averaged
+
+Request counters are pushed as a rate summed from per-replica deltas:
+each replica's /metrics covers all of its workers, but a fleet total
+would drop whenever a replica goes away
+"""
+import asyncio
+import json
+import logging
+import math
+import os
+import struct
+import time
+from typing import Dict, List, Optional, Tuple
+
+import httpx
+from prometheus_client.parser import text_string_to_metric_families
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+# Clients to collect: Zabbix host name -> API service
+# latency_window: also push fleet p99 over this sketch window (template needs the item)
+COLLECTOR_CONFIG = {
+    'cliente-a': {'namespace': 'cliente-a', 'service': 'cliente-a-api', 'port': 8000},
+    'cliente-b': {'namespace': 'cliente-b', 'service': 'cliente-b-api', 'port': 8000, 'latency_window': '1m'},
+    'cliente-c': {'namespace': 'cliente-c', 'service': 'cliente-c-api', 'port': 8000},
+}
+
+ZABBIX_SERVER = os.getenv('ZABBIX_SERVER', 'zabbix-server.monitoring.svc.cluster.local')
+ZABBIX_PORT = int(os.getenv('ZABBIX_PORT', '10051'))
+COLLECT_INTERVAL = float(os.getenv('COLLECT_INTERVAL', '30'))
+SCRAPE_TIMEOUT = float(os.getenv('SCRAPE_TIMEOUT', '5'))
+MAX_CONCURRENT_SCRAPES = int(os.getenv('MAX_CONCURRENT_SCRAPES', '50'))
+SENDER_BATCH_SIZE = int(os.getenv('SENDER_BATCH_SIZE', '250'))
+
+ZABBIX_HEADER = b'ZBXD\x01'
+
+
+# Discovery
+
+async def discover_targets(namespace: str, service: str, port: int) -> List[str]:
+    """
+    List the base URLs of ready pods behind a service
+
+    Args:
+        namespace: Kubernetes namespace
+        service: Service name (its Endpoints object has the same name)
+        port: Container port of the API
+
+    Returns:
+        list: Base URLs (http://ip:port), empty if discovery failed
+    """
+    cmd = ["kubectl", "get", "endpoints", service, "-n", namespace, "-o", "json"]
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *cmd,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+        stdout, stderr = await asyncio.wait_for(process.communicate(), timeout=10)
+    except asyncio.TimeoutError:
+        process.kill()
+        logger.error(f"Endpoint discovery timeout for {namespace}/{service}")
+        return []
+    except OSError as e:
+        logger.error(f"Endpoint discovery error for {namespace}/{service}: {e}")
+        return []
+
+    if process.returncode != 0:
+        logger.error(f"Endpoint discovery failed for {namespace}/{service}: {stderr.decode().strip()}")
+        return []
+
+    endpoints = json.loads(stdout)
+    return [
+        f"http://{address['ip']}:{port}"
+        for subset in endpoints.get('subsets', [])
+        for address in subset.get('addresses', [])
+    ]
+
+
+# Scraping
+
+async def scrape(client: httpx.AsyncClient, semaphore: asyncio.Semaphore, url: str) -> Optional[str]:
+    """Fetch one page, or None on error or timeout"""
+    async with semaphore:
+        try:
+            response = await client.get(url, timeout=SCRAPE_TIMEOUT)
+            response.raise_for_status()
+            return response.text
+        except httpx.HTTPError as e:
+            logger.warning(f"Scrape failed for {url}: {e!r}")
+            return None
+
+
+def merge_sketches(pages: List[str], endpoint_prefix: str = "/api/") -> Optional[dict]:
+    """
+    Merge the latency sketches of several replicas into one
+
+    Sketches with the same relative accuracy share bin keys, so merging is
+    adding counts per key. Only endpoints under endpoint_prefix are
+    included, leaving out probes and metrics scrapes.
+
+    Args:
+        pages: /metrics/sketches responses (JSON text)
+
+    Returns:
+        dict: {'gamma', 'zero_count', 'count', 'bins': {key: count}}, or None if empty
+    """
+    merged = None
+    for page in pages:
+        try:
+            page_series = json.loads(page)['series']
+        except (ValueError, KeyError) as e:
+            logger.warning(f"Ignoring invalid sketch page: {e!r}")
+            continue
+        for series in page_series:
+            if not series['endpoint'].startswith(endpoint_prefix):
+                continue
+            sketch = series['sketch']
+            accuracy = sketch['relative_accuracy']
+            gamma = (1 + accuracy) / (1 - accuracy)
+            if merged is None:
+                merged = {'gamma': gamma, 'zero_count': 0, 'count': 0, 'bins': {}}
+            elif not math.isclose(gamma, merged['gamma']):
+                raise ValueError("Cannot merge sketches with different relative accuracy")
+
+            merged['zero_count'] += sketch['zero_count']
+            merged['count'] += sketch['count']
+            bins = merged['bins']
+            for position, count in enumerate(sketch['bins']):
+                if count:
+                    key = sketch['offset'] + position
+                    bins[key] = bins.get(key, 0) + count
+
+    if merged is None or merged['count'] <= 0:
+        return None
+    return merged
+
+
+def sketch_quantile(sketch: dict, q: float) -> float:
+    """Quantile of a merged sketch, same estimate as DDSketch.quantile in the API"""
+    rank = q * (sketch['count'] - 1)
+    seen = sketch['zero_count']
+    if seen > rank:
+        return 0.0
+
+    gamma = sketch['gamma']
+    keys = sorted(sketch['bins'])
+    for key in keys:
+        seen += sketch['bins'][key]
+        if seen > rank:
+            break
+    return 2 * gamma ** key / (gamma + 1)
+
+
+def aggregate(pages: List[str]) -> Dict[str, float]:
+    """
+    Sum samples across pages and label sets
+
+    Returns:
+        dict: Sample name -> total across all pages and label sets
+    """
+    totals: Dict[str, float] = {}
+    for page in pages:
+        for family in text_string_to_metric_families(page):
+            for sample in family.samples:
+                totals[sample.name] = totals.get(sample.name, 0.0) + sample.value
+    return totals
+
+
+class CounterRates:
+    """
+    Fleet-wide rate of a counter from per-replica deltas
+
+    Usage:
+        rates = CounterRates('http_requests_total')
+        rate = rates.update(host, {target: page, ...})   # every collection
+
+    A replica's first scrape only sets its baseline. A value lower than
+    the previous one means the replica restarted, so the whole value is
+    counted as new. Replicas that stop answering are forgotten.
+    """
+
+    def __init__(self, sample_name: str):
+        self.sample_name = sample_name
+        # (host, target) -> (value, monotonic time of the scrape)
+        self._previous: Dict[Tuple[str, str], Tuple[float, float]] = {}
+
+    def update(self, host: str, pages: Dict[str, str], now: float = None) -> Optional[float]:
+        """
+        Record one collection of a host's replicas
+
+        Args:
+            host: Zabbix host the replicas belong to
+            pages: Target -> /metrics page, for replicas that answered
+
+        Returns:
+            float: Per-second rate summed over replicas with a baseline,
+            or None if no replica had one yet
+        """
+        now = time.monotonic() if now is None else now
+        rate = None
+        seen = set()
+        for target, page in pages.items():
+            key = (host, target)
+            seen.add(key)
+            value = aggregate([page]).get(self.sample_name)
+            if value is None:
+                continue
+
+            previous = self._previous.get(key)
+            self._previous[key] = (value, now)
+            if previous is None or now <= previous[1]:
+                continue
+            increase = value - previous[0] if value >= previous[0] else value
+            rate = (rate or 0.0) + increase / (now - previous[1])
+
+        for key in [key for key in self._previous if key[0] == host and key not in seen]:
+            del self._previous[key]
+        return rate
+
+
+def to_zabbix_items(
+    host: str,
+    namespace: str,
+    pods: int,
+    request_rate: Optional[float] = None,
+    latency: Dict[str, float] = None
+) -> List[dict]:
+    """
+    Map collected values to the item keys used in the client templates
+
+    Args:
+        request_rate: Fleet requests per second, if a rate could be computed
+        latency: Fleet p99 in seconds per sketch window, if collected
+    """
+    clock = int(time.time())
+    values = {
+        f"kubernetes.pods.count[{namespace}]": pods,
+    }
+    if request_rate is not None:
+        values['web.requests.rate'] = round(request_rate, 3)
+    for window, seconds in (latency or {}).items():
+        values[f"web.response.p99[{window}]"] = round(seconds * 1000, 3)
+
+    return [
+        {"host": host, "key": key, "value": str(value), "clock": clock}
+        for key, value in values.items()
+    ]
+
+
+async def collect_client(
+    http: httpx.AsyncClient,
+    semaphore: asyncio.Semaphore,
+    rates: CounterRates,
+    host: str,
+    config: dict
+) -> List[dict]:
+    """Discover, scrape and aggregate one client"""
+    targets = await discover_targets(config['namespace'], config['service'], config['port'])
+    pages = await asyncio.gather(*(scrape(http, semaphore, f"{target}/metrics") for target in targets))
+    scraped = {target: page for target, page in zip(targets, pages) if page is not None}
+
+    latency = {}
+    window = config.get('latency_window')
+    if window:
+        sketch_pages = await asyncio.gather(
+            *(scrape(http, semaphore, f"{target}/metrics/sketches?window={window}") for target in targets)
+        )
+        sketch = merge_sketches([page for page in sketch_pages if page is not None])
+        if sketch is not None:
+            latency[window] = sketch_quantile(sketch, 0.99)
+
+    logger.info(f"{host}: scraped {len(scraped)}/{len(targets)} replicas")
+    return to_zabbix_items(host, config['namespace'], len(targets), rates.update(host, scraped), latency)
+
+
+# Zabbix sender protocol
+
+def encode_packet(items: List[dict]) -> bytes:
+    """Frame a sender request: header, little-endian length, JSON body"""
+    body = json.dumps({"request": "sender data", "data": items}).encode()
+    return ZABBIX_HEADER + struct.pack('<Q', len(body)) + body
+
+
+async def read_packet(reader: asyncio.StreamReader) -> dict:
+    """Read one framed Zabbix packet"""
+    header = await reader.readexactly(len(ZABBIX_HEADER) + 8)
+    if not header.startswith(ZABBIX_HEADER):
+        raise ValueError("Invalid Zabbix packet header")
+    length, = struct.unpack('<Q', header[len(ZABBIX_HEADER):])
+    return json.loads(await reader.readexactly(length))
+
+
+async def send_to_zabbix(items: List[dict], server: str = None, port: int = None) -> Tuple[int, int]:
+    """
+    Push values to the Zabbix trapper in batches
+
+    One connection per packet (the trapper closes after replying).
+
+    Returns:
+        tuple: (processed, failed) as reported by the server
+    """
+    server = server or ZABBIX_SERVER
+    port = port or ZABBIX_PORT
+    processed = failed = 0
+
+    for start in range(0, len(items), SENDER_BATCH_SIZE):
+        batch = items[start:start + SENDER_BATCH_SIZE]
+        try:
+            reader, writer = await asyncio.wait_for(asyncio.open_connection(server, port), timeout=10)
+            try:
+                writer.write(encode_packet(batch))
+                await writer.drain()
+                response = await asyncio.wait_for(read_packet(reader), timeout=10)
+            finally:
+                writer.close()
+                await writer.wait_closed()
+        except (OSError, ValueError, asyncio.TimeoutError, asyncio.IncompleteReadError) as e:
+            logger.error(f"Zabbix send failed for {len(batch)} values: {e!r}")
+            failed += len(batch)
+            continue
+
+        # info: "processed: 2; failed: 0; total: 2; seconds spent: 0.000055"
+        info = dict(
+            part.strip().split(': ', 1)
+            for part in response.get('info', '').split(';') if ': ' in part
+        )
+        processed += int(info.get('processed', 0))
+        failed += int(info.get('failed', 0))
+
+    return processed, failed
+
+
+# Main loop
+
+async def collect_once(http: httpx.AsyncClient, semaphore: asyncio.Semaphore, rates: CounterRates) -> List[dict]:
+    """Collect every client concurrently"""
+    results = await asyncio.gather(
+        *(collect_client(http, semaphore, rates, host, config) for host, config in COLLECTOR_CONFIG.items()),
+        return_exceptions=True
+    )
+
+    items = []
+    for host, result in zip(COLLECTOR_CONFIG, results):
+        if isinstance(result, Exception):
+            logger.error(f"Collection failed for {host}: {result!r}")
+        else:
+            items.extend(result)
+    return items
+
+
+async def main():
+    """Collect and send every COLLECT_INTERVAL seconds"""
+    logger.info("=" * 50)
+    logger.info("Metrics Collector - Starting")
+    logger.info(f"Zabbix: {ZABBIX_SERVER}:{ZABBIX_PORT}, interval: {COLLECT_INTERVAL}s")
+    logger.info("=" * 50)
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_SCRAPES)
+    rates = CounterRates('http_requests_total')
+    limits = httpx.Limits(
+        max_connections=MAX_CONCURRENT_SCRAPES,
+        max_keepalive_connections=MAX_CONCURRENT_SCRAPES,
+        keepalive_expiry=COLLECT_INTERVAL * 2
+    )
+
+    async with httpx.AsyncClient(limits=limits) as http:
+        while True:
+            started = time.monotonic()
+
+            items = await collect_once(http, semaphore, rates)
+            if items:
+                processed, failed = await send_to_zabbix(items)
+                logger.info(f"Sent {len(items)} values to Zabbix: processed {processed}, failed {failed}")
+
+            elapsed = time.monotonic() - started
+            await asyncio.sleep(max(0.0, COLLECT_INTERVAL - elapsed))
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,10 @@
+"""
+Shared test setup.
+
+The automation scripts are run from their own directory and import each
+other by top-level name.
+"""
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
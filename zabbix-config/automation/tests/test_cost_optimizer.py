@@ -0,0 +1,51 @@
+"""Tests for right-sizing recommendations from usage history."""
+import csv
+
+from cost_optimizer import RIGHT_SIZING_CONFIG, load_history, recommend
+
+HOURS = 2
+
+
+def write_history(path, cadence_seconds: int, stagger: bool = False):
+    """
+    Write the same cliente-b load sampled every cadence_seconds
+
+    Usage is constant within each minute, which starts on a history
+    bucket boundary, so only the sampling differs.
+    With stagger, pod-2 is sampled at half the rate of pod-1.
+    """
+    with open(path, 'w', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(['timestamp', 'client', 'pod', 'cpu_m', 'memory_mi', 'requests_per_second'])
+        for minute in range(HOURS * 60):
+            pods = 2 + minute % 3
+            for offset in range(0, 60, cadence_seconds):
+                for pod in range(pods):
+                    if stagger and pod == 1 and offset % (2 * cadence_seconds):
+                        continue
+                    cpu = 80 + (minute * 7 + pod * 13) % 90
+                    writer.writerow([
+                        1_699_999_980 + minute * 60 + offset,
+                        'cliente-b',
+                        f'api-{pod}',
+                        cpu,
+                        150 + pod * 10,
+                        cpu / 2
+                    ])
+
+
+def recommendation(path):
+    report = recommend('cliente-b', load_history(path)['cliente-b'], RIGHT_SIZING_CONFIG['cliente-b'])
+    return report['usage'], report['recommended']
+
+
+def test_recommendation_does_not_depend_on_sampling_cadence(tmp_path):
+    write_history(tmp_path / 'per-minute.csv', 60)
+    write_history(tmp_path / 'every-15s.csv', 15)
+    write_history(tmp_path / 'staggered.csv', 15, stagger=True)
+
+    expected = recommendation(tmp_path / 'per-minute.csv')
+
+    assert recommendation(tmp_path / 'every-15s.csv') == expected
+    assert recommendation(tmp_path / 'staggered.csv') == expected
+    assert expected[0]['replicas'] == {'min': 2, 'max': 4}
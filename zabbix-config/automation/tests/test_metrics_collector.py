@@ -0,0 +1,163 @@
+"""Tests for the metrics collector against the local Zabbix trapper stub."""
+import asyncio
+import json
+import math
+
+import pytest
+
+import metrics_collector
+from metrics_collector import (
+    CounterRates, aggregate, merge_sketches, send_to_zabbix, sketch_quantile, to_zabbix_items
+)
+from zabbix_stub import ZabbixStub
+
+REPLICA_1 = """\
+# HELP http_requests_total Total HTTP requests
+# TYPE http_requests_total counter
+http_requests_total{method="GET",endpoint="/api/items",status="200",client="cliente-a"} 120.0
+http_requests_total{method="POST",endpoint="/api/items",status="201",client="cliente-a"} 30.0
+# HELP items_total Items in the store
+# TYPE items_total gauge
+items_total{client="cliente-a"} 7.0
+"""
+
+REPLICA_2 = """\
+# HELP http_requests_total Total HTTP requests
+# TYPE http_requests_total counter
+http_requests_total{method="GET",endpoint="/api/items",status="200",client="cliente-a"} 50.0
+# HELP items_total Items in the store
+# TYPE items_total gauge
+items_total{client="cliente-a"} 3.0
+"""
+
+
+def make_values(count: int, key: str = "web.requests.rate") -> list:
+    return [{"host": "cliente-a", "key": key, "value": str(i), "clock": 1700000000} for i in range(count)]
+
+
+def send(values: list, known_keys: set = None):
+    """Send values to a fresh stub; returns (processed, failed, stub)."""
+    async def run():
+        stub = ZabbixStub(known_keys=known_keys)
+        await stub.start()
+        try:
+            processed, failed = await send_to_zabbix(values, "127.0.0.1", stub.port)
+        finally:
+            await stub.stop()
+        return processed, failed, stub
+
+    return asyncio.run(run())
+
+
+def test_send_batches_at_sender_batch_size(monkeypatch):
+    monkeypatch.setattr(metrics_collector, "SENDER_BATCH_SIZE", 4)
+
+    processed, failed, stub = send(make_values(10))
+
+    assert stub.packets == 3
+    assert (processed, failed) == (10, 0)
+    assert [item["value"] for item in stub.received] == [str(i) for i in range(10)]
+
+
+def test_processed_and_failed_counts_come_from_server_info():
+    values = make_values(3) + make_values(2, key="unknown.key")
+
+    processed, failed, stub = send(values, known_keys={"web.requests.rate"})
+
+    assert (processed, failed) == (3, 2)
+    assert len(stub.received) == 3
+
+
+def test_unreachable_server_counts_every_value_as_failed():
+    async def run():
+        stub = ZabbixStub()
+        await stub.start()
+        port = stub.port
+        await stub.stop()
+        return await send_to_zabbix(make_values(5), "127.0.0.1", port)
+
+    assert asyncio.run(run()) == (0, 5)
+
+
+def test_aggregate_sums_samples_across_replicas():
+    totals = aggregate([REPLICA_1, REPLICA_2])
+
+    assert totals["http_requests_total"] == pytest.approx(200.0)
+    assert totals["items_total"] == pytest.approx(10.0)
+
+
+def requests_page(count: float) -> str:
+    return REPLICA_2.replace("} 50.0", f"}} {count}")
+
+
+def test_request_rate_sums_per_replica_deltas():
+    rates = CounterRates("http_requests_total")
+
+    # First scrape of a replica only sets its baseline
+    assert rates.update("cliente-a", {"a": requests_page(100), "b": requests_page(1000)}, now=0) is None
+    assert rates.update("cliente-a", {"a": requests_page(130), "b": requests_page(1060)}, now=30) == pytest.approx(3.0)
+
+
+def test_request_rate_survives_restarts_and_replicas_coming_and_going():
+    rates = CounterRates("http_requests_total")
+    rates.update("cliente-a", {"a": requests_page(100), "b": requests_page(1000)}, now=0)
+
+    # b restarted and counts from zero again; c is new; rate stays positive
+    rate = rates.update("cliente-a", {"a": requests_page(130), "b": requests_page(30), "c": requests_page(5)}, now=30)
+    assert rate == pytest.approx(2.0)
+
+    # a went away: the rate comes from the replicas still answering
+    assert rates.update("cliente-a", {"b": requests_page(60), "c": requests_page(35)}, now=60) == pytest.approx(2.0)
+    # a comes back later with a fresh baseline, not a delta from 130
+    assert rates.update("cliente-a", {"a": requests_page(10), "b": requests_page(90)}, now=90) == pytest.approx(1.0)
+
+
+def test_collected_values_map_to_template_keys():
+    items = to_zabbix_items("cliente-a", "cliente-a", 2, request_rate=3.14159)
+
+    values = {item["key"]: item["value"] for item in items}
+    assert values == {"kubernetes.pods.count[cliente-a]": "2", "web.requests.rate": "3.142"}
+
+
+def sketch_page(values: list, endpoint: str = "/api/items", accuracy: float = 0.01) -> str:
+    """A /metrics/sketches response holding the given latencies (seconds)."""
+    gamma = (1 + accuracy) / (1 - accuracy)
+    keys = [math.ceil(math.log(value) / math.log(gamma)) for value in values]
+    offset = min(keys)
+    bins = [0] * (max(keys) - offset + 1)
+    for key in keys:
+        bins[key - offset] += 1
+
+    return json.dumps({"client": "cliente-b", "workers": 4, "series": [{
+        "method": "POST",
+        "endpoint": endpoint,
+        "client": "cliente-b",
+        "window": "1m",
+        "sketch": {
+            "relative_accuracy": accuracy,
+            "offset": offset,
+            "bins": bins,
+            "zero_count": 0,
+            "count": len(values)
+        }
+    }]})
+
+
+def test_fleet_p99_merges_replica_sketches():
+    # The slow replica alone holds the tail; averaging per-replica p99s would hide it
+    fast = [0.010] * 900
+    slow = [0.010] * 50 + [0.500] * 50
+    pages = [sketch_page(fast), sketch_page(slow), sketch_page([5.0] * 100, endpoint="/health")]
+
+    sketch = merge_sketches(pages)
+
+    assert sketch["count"] == 1000
+    assert sketch_quantile(sketch, 0.5) == pytest.approx(0.010, rel=0.02)
+    assert sketch_quantile(sketch, 0.99) == pytest.approx(0.500, rel=0.02)
+
+
+def test_latency_is_pushed_in_milliseconds():
+    items = to_zabbix_items("cliente-b", "cliente-b", 3, latency={"1m": 0.25})
+
+    values = {item["key"]: item["value"] for item in items}
+    assert values["web.response.p99[1m]"] == "250.0"
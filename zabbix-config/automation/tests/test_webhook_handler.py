@@ -0,0 +1,149 @@
+"""Tests for scaling decisions, kubectl instrumentation and time-to-capacity tracking."""
+import asyncio
+import os
+import subprocess
+import threading
+from pathlib import Path
+
+import pytest
+from fastapi import HTTPException
+from prometheus_client import REGISTRY
+
+os.environ.setdefault("WEBHOOK_CONFIG", str(Path(__file__).with_name("webhook-config.yaml")))
+
+import webhook_handler
+from webhook_handler import TriggerPayload, instrumented, scale_for_trigger, scale_to_minimum
+
+
+class FakeKubectl:
+    """Stands in for run_kubectl with a scripted deployment."""
+
+    def __init__(self, replicas: int, ready: list, scale_returncode: int = 0):
+        self.replicas = replicas
+        self.ready = list(ready)
+        self.scale_returncode = scale_returncode
+        self.calls = []
+
+    def __call__(self, client, action, operation, cmd, timeout):
+        self.calls.append((client, action, operation, threading.current_thread() is threading.main_thread()))
+        if operation == "scale":
+            return subprocess.CompletedProcess(cmd, self.scale_returncode, "", "forbidden")
+        if operation == "get_replicas":
+            return subprocess.CompletedProcess(cmd, 0, str(self.replicas), "")
+        # Keep reporting the last value once the script runs out
+        ready = self.ready.pop(0) if len(self.ready) > 1 else self.ready[0]
+        return subprocess.CompletedProcess(cmd, 0, str(ready), "")
+
+
+def sample(name: str, **labels) -> float:
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def trigger(client: str, action: str) -> TriggerPayload:
+    return TriggerPayload(
+        client=client,
+        namespace=client,
+        deployment=f"{client}-api",
+        metric="web.response.p99[1m]",
+        action=action
+    )
+
+
+def handle(payload: TriggerPayload, handler=scale_for_trigger) -> dict:
+    """Handle a trigger and wait for the capacity tracker it started."""
+    async def run():
+        result = await instrumented(payload, handler)
+        await asyncio.gather(*webhook_handler.capacity_trackers)
+        return result
+
+    return asyncio.run(run())
+
+
+@pytest.fixture
+def kubectl(monkeypatch):
+    def install(**kwargs) -> FakeKubectl:
+        fake = FakeKubectl(**kwargs)
+        monkeypatch.setattr(webhook_handler, "run_kubectl", fake)
+        return fake
+
+    return install
+
+
+def test_scale_up_records_time_to_capacity_once_ready(kubectl):
+    fake = kubectl(replicas=5, ready=[5, 6, 7])
+    reached = sample("webhook_time_to_capacity_seconds_count", client="cliente-b", action="scale_up", outcome="reached")
+    decisions = sample("webhook_scaling_decisions_total", client="cliente-b", action="scale_up", outcome="success")
+
+    result = handle(trigger("cliente-b", "scale_up"))
+
+    assert (result["previous_replicas"], result["target_replicas"]) == (5, 7)
+    assert sample("webhook_time_to_capacity_seconds_count", client="cliente-b", action="scale_up", outcome="reached") == reached + 1
+    assert sample("webhook_scaling_decisions_total", client="cliente-b", action="scale_up", outcome="success") == decisions + 1
+    assert [call[2] for call in fake.calls].count("get_ready_replicas") == 3
+    # Every kubectl call ran off the event loop thread
+    assert not any(on_loop_thread for *_, on_loop_thread in fake.calls)
+    assert {(client, action) for client, action, _, _ in fake.calls} == {("cliente-b", "scale_up")}
+
+
+def test_replicas_that_never_become_ready_record_a_timeout(kubectl, monkeypatch):
+    monkeypatch.setattr(webhook_handler, "CAPACITY_TIMEOUT", 0.05)
+    kubectl(replicas=2, ready=[2])
+    timeouts = sample("webhook_time_to_capacity_seconds_count", client="cliente-a", action="scale_up", outcome="timeout")
+
+    handle(trigger("cliente-a", "scale_up"))
+
+    assert sample("webhook_time_to_capacity_seconds_count", client="cliente-a", action="scale_up", outcome="timeout") == timeouts + 1
+    assert sample("webhook_scale_actions_in_progress", client="cliente-a") == 0
+
+
+def test_scale_down_is_reached_when_ready_replicas_drop_to_target(kubectl):
+    fake = kubectl(replicas=4, ready=[4, 3])
+    reached = sample("webhook_time_to_capacity_seconds_count", client="cliente-a", action="scale_down", outcome="reached")
+
+    result = handle(trigger("cliente-a", "scale_down"))
+
+    assert result["target_replicas"] == 3
+    assert sample("webhook_time_to_capacity_seconds_count", client="cliente-a", action="scale_down", outcome="reached") == reached + 1
+    assert [call[2] for call in fake.calls].count("get_ready_replicas") == 2
+
+
+def test_scale_to_minimum_tracks_capacity(kubectl):
+    kubectl(replicas=8, ready=[8, 2])
+    reached = sample("webhook_time_to_capacity_seconds_count", client="cliente-a", action="scale_to_minimum", outcome="reached")
+
+    result = handle(trigger("cliente-a", "scale_to_minimum"), scale_to_minimum)
+
+    assert result == {"status": "optimized", "client": "cliente-a", "replicas": 2}
+    assert sample("webhook_time_to_capacity_seconds_count", client="cliente-a", action="scale_to_minimum", outcome="reached") == reached + 1
+
+
+def test_decision_outcomes_for_rejected_and_failed_triggers(kubectl):
+    rejected = sample("webhook_scaling_decisions_total", client="cliente-z", action="scale_up", outcome="rejected")
+    failed = sample("webhook_scaling_decisions_total", client="cliente-a", action="scale_up", outcome="failed")
+
+    with pytest.raises(HTTPException):
+        handle(trigger("cliente-z", "scale_up"))
+    kubectl(replicas=2, ready=[2], scale_returncode=1)
+    with pytest.raises(HTTPException):
+        handle(trigger("cliente-a", "scale_up"))
+
+    assert sample("webhook_scaling_decisions_total", client="cliente-z", action="scale_up", outcome="rejected") == rejected + 1
+    assert sample("webhook_scaling_decisions_total", client="cliente-a", action="scale_up", outcome="failed") == failed + 1
+
+
+def test_kubectl_latency_is_labelled_by_client_and_action(monkeypatch):
+    monkeypatch.setattr(
+        webhook_handler.subprocess, "run",
+        lambda cmd, **kwargs: subprocess.CompletedProcess(cmd, 0, "3", "")
+    )
+    before = sample(
+        "webhook_kubernetes_api_duration_seconds_count",
+        client="cliente-c", action="scale_down", operation="get_replicas", outcome="success"
+    )
+
+    assert webhook_handler.get_current_replicas("cliente-c", "scale_down", "cliente-c", "cliente-c-api") == 3
+
+    assert sample(
+        "webhook_kubernetes_api_duration_seconds_count",
+        client="cliente-c", action="scale_down", operation="get_replicas", outcome="success"
+    ) == before + 1
@@ -3,9 +3,14 @@ Webhook Handler for Zabbix Triggers
 Receives alerts from Zabbix and triggers auto-scaling actions
 """
 from fastapi import FastAPI, Request, HTTPException
+from fastapi.responses import Response
 from pydantic import BaseModel
+from prometheus_client import Counter, Gauge, Histogram, generate_latest, CONTENT_TYPE_LATEST
+import asyncio
+import os
 import subprocess
 import logging
+import time
 import yaml
 from pathlib import Path
 from typing import Optional
@@ -20,12 +25,50 @@ logger = logging.getLogger(__name__)
 app = FastAPI(title="Zabbix Webhook Handler")
 
 # Load scaling policies
-config_path = Path("/app/config/config.yaml")
+config_path = Path(os.getenv("WEBHOOK_CONFIG", "/app/config/config.yaml"))
 with open(config_path) as f:
     config = yaml.safe_load(f)
 
 SCALING_POLICIES = config.get("scaling_policies", {})
 
+# Time-to-capacity tracking
+CAPACITY_POLL_INTERVAL = config.get("capacity_poll_interval_seconds", 2)
+CAPACITY_TIMEOUT = config.get("capacity_timeout_seconds", 600)
+
+# Metrics
+trigger_duration_seconds = Histogram(
+    'webhook_trigger_duration_seconds',
+    'Time from receiving a trigger to responding',
+    ['client', 'action', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0, 60.0)
+)
+
+kubernetes_api_duration_seconds = Histogram(
+    'webhook_kubernetes_api_duration_seconds',
+    'kubectl call latency',
+    ['client', 'action', 'operation', 'outcome'],
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.0, 5.0, 10.0, 30.0)
+)
+
+scaling_decisions_total = Counter(
+    'webhook_scaling_decisions_total',
+    'Scaling decisions by outcome',
+    ['client', 'action', 'outcome']
+)
+
+time_to_capacity_seconds = Histogram(
+    'webhook_time_to_capacity_seconds',
+    'Time from receiving a trigger until ready replicas reach the target',
+    ['client', 'action', 'outcome'],
+    buckets=(5, 10, 15, 30, 45, 60, 90, 120, 180, 300, 600)
+)
+
+scale_actions_in_progress = Gauge(
+    'webhook_scale_actions_in_progress',
+    'Scale actions still waiting for ready replicas to reach the target',
+    ['client']
+)
+
 
 class TriggerPayload(BaseModel):
     """Zabbix trigger payload"""
@@ -37,11 +80,48 @@ class TriggerPayload(BaseModel):
     priority: Optional[str] = "normal"
 
 
-def kubectl_scale(namespace: str, deployment: str, replicas: int) -> bool:
+def run_kubectl(client: str, action: str, operation: str, cmd: list, timeout: int) -> subprocess.CompletedProcess:
+    """
+    Run a kubectl command and record its latency
+    
+    Blocks until kubectl exits; call it through asyncio.to_thread from
+    request handlers.
+    
+    Args:
+        client: Client the call is made for
+        action: Trigger action the call is part of
+        operation: Label for the metrics (scale, get_replicas, ...)
+        cmd: Full command line
+        timeout: Seconds before the command is killed
+        
+    Returns:
+        subprocess.CompletedProcess: Result of the command
+    """
+    start_time = time.monotonic()
+    outcome = "error"
+    try:
+        result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
+        outcome = "success" if result.returncode == 0 else "failed"
+        return result
+    except subprocess.TimeoutExpired:
+        outcome = "timeout"
+        raise
+    finally:
+        kubernetes_api_duration_seconds.labels(
+            client=client,
+            action=action,
+            operation=operation,
+            outcome=outcome
+        ).observe(time.monotonic() - start_time)
+
+
+def kubectl_scale(client: str, action: str, namespace: str, deployment: str, replicas: int) -> bool:
     """
     Scale Kubernetes deployment using kubectl
     
     Args:
+        client: Client the deployment belongs to
+        action: Trigger action being applied
         namespace: Kubernetes namespace
         deployment: Deployment name
         replicas: Target replica count
@@ -56,12 +136,7 @@ def kubectl_scale(namespace: str, deployment: str, replicas: int) -> bool:
             "-n", namespace
         ]
         
-        result = subprocess.run(
-            cmd,
-            capture_output=True,
-            text=True,
-            timeout=30
-        )
+        result = run_kubectl(client, action, "scale", cmd, timeout=30)
         
         if result.returncode == 0:
             logger.info(f"Scaled {namespace}/{deployment} to {replicas} replicas")
@@ -78,7 +153,7 @@ def kubectl_scale(namespace: str, deployment: str, replicas: int) -> bool:
         return False
 
 
-def get_current_replicas(namespace: str, deployment: str) -> int:
+def get_current_replicas(client: str, action: str, namespace: str, deployment: str) -> int:
     """Get current replica count"""
     try:
         cmd = [
@@ -87,7 +162,7 @@ def get_current_replicas(namespace: str, deployment: str) -> int:
             "-o", "jsonpath={.spec.replicas}"
         ]
         
-        result = subprocess.run(cmd, capture_output=True, text=True, timeout=10)
+        result = run_kubectl(client, action, "get_replicas", cmd, timeout=10)
         
         if result.returncode == 0:
             return int(result.stdout.strip())
@@ -100,6 +175,117 @@ def get_current_replicas(namespace: str, deployment: str) -> int:
         return 0
 
 
+def get_ready_replicas(client: str, action: str, namespace: str, deployment: str) -> Optional[int]:
+    """Get ready replica count, or None if it could not be read"""
+    try:
+        cmd = [
+            "kubectl", "get", "deployment", deployment,
+            "-n", namespace,
+            "-o", "jsonpath={.status.readyReplicas}"
+        ]
+        
+        result = run_kubectl(client, action, "get_ready_replicas", cmd, timeout=10)
+        
+        if result.returncode == 0:
+            # Field is omitted when no replica is ready
+            return int(result.stdout.strip() or 0)
+        else:
+            logger.error(f"Failed to get ready replicas: {result.stderr}")
+            return None
+            
+    except Exception as e:
+        logger.error(f"Error getting ready replicas: {e}")
+        return None
+
+
+async def track_capacity(
+    client: str,
+    action: str,
+    namespace: str,
+    deployment: str,
+    target_replicas: int,
+    scale_up: bool,
+    started_at: float
+):
+    """
+    Watch a scale action until ready replicas reach the target
+    
+    Records time-to-capacity measured from when the trigger arrived,
+    which is what the client SLA depends on. Gives up after
+    CAPACITY_TIMEOUT seconds and records the attempt as a timeout.
+    """
+    scale_actions_in_progress.labels(client=client).inc()
+    outcome = "timeout"
+    try:
+        while time.monotonic() - started_at < CAPACITY_TIMEOUT:
+            ready = await asyncio.to_thread(get_ready_replicas, client, action, namespace, deployment)
+            if ready is not None and (ready >= target_replicas if scale_up else ready <= target_replicas):
+                outcome = "reached"
+                break
+            await asyncio.sleep(CAPACITY_POLL_INTERVAL)
+    finally:
+        elapsed = time.monotonic() - started_at
+        scale_actions_in_progress.labels(client=client).dec()
+        time_to_capacity_seconds.labels(
+            client=client,
+            action=action,
+            outcome=outcome
+        ).observe(elapsed)
+        
+        if outcome == "reached":
+            logger.info(f"{namespace}/{deployment} reached {target_replicas} ready replicas in {elapsed:.1f}s")
+        else:
+            logger.warning(f"{namespace}/{deployment} did not reach {target_replicas} ready replicas in {elapsed:.1f}s")
+
+
+def start_capacity_tracking(payload, target_replicas: int, scale_up: bool, started_at: float):
+    """Start a background task tracking time-to-capacity for a scale action"""
+    task = asyncio.create_task(track_capacity(
+        payload.client,
+        payload.action,
+        payload.namespace,
+        payload.deployment,
+        target_replicas,
+        scale_up,
+        started_at
+    ))
+    # Keep a reference so the task is not garbage collected mid-flight
+    capacity_trackers.add(task)
+    task.add_done_callback(capacity_trackers.discard)
+
+
+capacity_trackers = set()
+
+
+async def instrumented(payload: TriggerPayload, handler):
+    """
+    Run a scaling handler and record its latency and decision outcome
+    
+    Outcome is the handler's result status (success, no_change,
+    optimized), "rejected" for client errors or "failed" otherwise.
+    """
+    started_at = time.monotonic()
+    outcome = "failed"
+    try:
+        result = await handler(payload, started_at)
+        outcome = result["status"]
+        return result
+    except HTTPException as e:
+        outcome = "rejected" if e.status_code < 500 else "failed"
+        raise
+    finally:
+        scaling_decisions_total.labels(
+            client=payload.client,
+            action=payload.action,
+            outcome=outcome
+        ).inc()
+        trigger_duration_seconds.labels(
+            client=payload.client,
+            action=payload.action,
+            outcome=outcome
+        ).observe(time.monotonic() - started_at)
+
+
 @app.post("/trigger")
 async def handle_trigger(payload: TriggerPayload):
     """
@@ -107,6 +293,11 @@ async def handle_trigger(payload: TriggerPayload):
     
     Receives trigger from Zabbix and scales deployment accordingly
     """
+    return await instrumented(payload, scale_for_trigger)
+
+
+async def scale_for_trigger(payload: TriggerPayload, started_at: float):
+    """Decide the target replica count for a trigger and apply it"""
     logger.info(f"Received trigger: {payload.dict()}")
     
     # Get scaling policy for client
@@ -115,8 +306,14 @@ async def handle_trigger(payload: TriggerPayload):
         logger.error(f"No scaling policy found for client: {payload.client}")
         raise HTTPException(status_code=404, detail="Client policy not found")
     
-    # Get current replicas
-    current_replicas = get_current_replicas(payload.namespace, payload.deployment)
+    # kubectl blocks, so keep it off the event loop serving /metrics and the trackers
+    current_replicas = await asyncio.to_thread(
+        get_current_replicas,
+        payload.client,
+        payload.action,
+        payload.namespace,
+        payload.deployment
+    )
     if current_replicas == 0:
         raise HTTPException(status_code=500, detail="Failed to get current replicas")
     
@@ -139,13 +336,22 @@ async def handle_trigger(payload: TriggerPayload):
     
     # Execute scaling
     if target_replicas != current_replicas:
-        success = kubectl_scale(
+        success = await asyncio.to_thread(
+            kubectl_scale,
+            payload.client,
+            payload.action,
             payload.namespace,
             payload.deployment,
             target_replicas
         )
         
         if success:
+            start_capacity_tracking(
+                payload,
+                target_replicas,
+                scale_up=target_replicas > current_replicas,
+                started_at=started_at
+            )
             return {
                 "status": "success",
                 "client": payload.client,
@@ -169,6 +375,11 @@ async def handle_cost_optimization(payload: TriggerPayload):
     
     Scales deployment to minimum during off-hours
     """
+    return await instrumented(payload, scale_to_minimum)
+
+
+async def scale_to_minimum(payload: TriggerPayload, started_at: float):
+    """Scale a deployment to its policy minimum"""
     logger.info(f"Cost optimization triggered for {payload.client}")
     
     policy = SCALING_POLICIES.get(payload.client)
@@ -177,13 +388,17 @@ async def handle_cost_optimization(payload: TriggerPayload):
     
     min_replicas = policy.get("min_replicas", 1)
     
-    success = kubectl_scale(
+    success = await asyncio.to_thread(
+        kubectl_scale,
+        payload.client,
+        payload.action,
         payload.namespace,
         payload.deployment,
         min_replicas
     )
     
     if success:
+        start_capacity_tracking(payload, min_replicas, scale_up=False, started_at=started_at)
         return {
             "status": "optimized",
             "client": payload.client,
@@ -193,6 +408,17 @@ async def handle_cost_optimization(payload: TriggerPayload):
         raise HTTPException(status_code=500, detail="Optimization failed")
 
 
+@app.get("/metrics")
+async def metrics():
+    """
+    Prometheus metrics endpoint
+    
+    Exposes trigger handling latency, kubectl latency, decision
+    outcomes and time-to-capacity per client and action.
+    """
+    return Response(content=generate_latest(), media_type=CONTENT_TYPE_LATEST)
+
+
 @app.get("/health")
 async def health_check():
     """Health check endpoint"""
@@ -0,0 +1,100 @@
+"""
+Zabbix Trapper Stub - local stand-in for testing the metrics collector
+Speaks the sender protocol and records every value it receives
+
+Usage:
+    python zabbix_stub.py --port 10051
+    ZABBIX_SERVER=127.0.0.1 python metrics_collector.py
+"""
+import argparse
+import asyncio
+import json
+import logging
+import struct
+import time
+
+from metrics_collector import ZABBIX_HEADER, read_packet
+
+logging.basicConfig(
+    level=logging.INFO,
+    format='%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+)
+logger = logging.getLogger(__name__)
+
+
+class ZabbixStub:
+    """
+    Minimal Zabbix trapper
+
+    Usage:
+        stub = ZabbixStub()
+        await stub.start()          # binds 127.0.0.1 on a free port
+        ...send to stub.port...
+        stub.received               # list of received values
+        await stub.stop()
+    """
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, known_keys: set = None):
+        self.host = host
+        self.port = port
+        # When set, values for other keys are reported as failed, like Zabbix
+        # does for keys without a trapper item
+        self.known_keys = known_keys
+        self.received = []
+        self.packets = 0
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        logger.info(f"Zabbix stub listening on {self.host}:{self.port}")
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handle(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        started = time.monotonic()
+        try:
+            request = await read_packet(reader)
+        except (ValueError, asyncio.IncompleteReadError) as e:
+            logger.warning(f"Invalid packet: {e!r}")
+            writer.close()
+            return
+
+        data = request.get("data", [])
+        accepted = [
+            item for item in data
+            if self.known_keys is None or item["key"] in self.known_keys
+        ]
+        self.received.extend(accepted)
+        self.packets += 1
+
+        body = json.dumps({
+            "response": "success",
+            "info": (
+                f"processed: {len(accepted)}; failed: {len(data) - len(accepted)}; "
+                f"total: {len(data)}; seconds spent: {time.monotonic() - started:.6f}"
+            )
+        }).encode()
+        writer.write(ZABBIX_HEADER + struct.pack('<Q', len(body)) + body)
+        await writer.drain()
+        writer.close()
+
+        for item in accepted:
+            logger.info(f"{item['host']} {item['key']} = {item['value']}")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description="Local Zabbix trapper stub")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=10051)
+    args = parser.parse_args()
+
+    stub = ZabbixStub(args.host, args.port)
+    await stub.start()
+    await asyncio.Event().wait()
+
+
+if __name__ == "__main__":
+    asyncio.run(main())